@@ -1,8 +1,10 @@
 from fastapi import APIRouter
 
 from app.books.views import router as books_router
+from app.readers.views import router as readers_router
 
 
 api_router = APIRouter()
 
 api_router.include_router(books_router, prefix="/books", tags=["books"])
+api_router.include_router(readers_router, prefix="/readers", tags=["readers"])
@@ -0,0 +1,10 @@
+from app.config import settings
+from app.books.services import book_service, async_book_service
+
+
+# views of every router serving books run on the service matching the session get_db yields
+service = async_book_service if settings.db_async else book_service
+book_rels = [
+    {"rel": "borrow", "method": "PATCH", "overwrite": "update", "endpoint": "/borrow"},
+    {"rel": "return", "method": "POST", "endpoint": "/return"},
+]
@@ -0,0 +1,38 @@
+"""Command line import of books, meant for large files like the nightly catalog sync.
+
+uv run python -m app.books.imports books.csv --result import-result.ndjson
+"""
+
+from argparse import ArgumentParser
+
+from app.database import engine, prepare_sessionmaker
+from app.utils.imports import IMPORT_FORMATS, guess_import_format, read_rows
+from app.utils.logs import setup_logging
+from app.books.schemas import BookCreate
+from app.books.services import book_service
+
+
+def main(argv: list[str] | None = None) -> dict[str, int]:
+    parser = ArgumentParser(description="Import books from a CSV or NDJSON file.")
+    parser.add_argument("path", help="file with one book per row")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="guessed from extension if empty")
+    parser.add_argument("--result", default="import-result.ndjson", help="progress and errors")
+    args = parser.parse_args(argv)
+
+    import_format = args.format or guess_import_format(args.path)
+    with (
+        open(args.path, "rb") as source,
+        open(args.result, "w") as report,
+        prepare_sessionmaker(engine)() as db_session,
+    ):
+        return book_service.import_rows(
+            db_session, read_rows(source, import_format), BookCreate, report
+        )
+
+
+if __name__ == "__main__":
+    log_listener = setup_logging("INFO", sample_rate=1.0)
+    try:
+        main()
+    finally:
+        log_listener.stop()
@@ -1,12 +1,46 @@
+from sqlalchemy import DDL, Index, String, event, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.database import Base
-from app.models import serial_number, datetime_tz, sql_index
+from app.models import serial_number, datetime_tz, sql_index, new_row_version
 
 
 class Book(Base):
     id: Mapped[serial_number] = mapped_column(primary_key=True)
-    title: Mapped[str]
+    title: Mapped[sql_index(str)]
     author: Mapped[sql_index(str)]
     reader: Mapped[sql_index(serial_number | None)]
     borrowing_time: Mapped[datetime_tz | None]
+    version: Mapped[str] = mapped_column(
+        String(32), default=new_row_version, info={"serialize": False}
+    )
+
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": new_row_version}
+    __table_args__ = (
+        Index(
+            "ix_book_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_book_author_trgm",
+            "author",
+            postgresql_using="gin",
+            postgresql_ops={"author": "gin_trgm_ops"},
+        ),
+        # free books have no borrowing time, only loans are worth indexing
+        Index(
+            "ix_book_borrowing_time_lent",
+            "borrowing_time",
+            postgresql_where=text("reader IS NOT NULL"),
+        ),
+    )
+
+
+# trigram indexes need the extension, migrations create it too
+event.listen(
+    Book.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
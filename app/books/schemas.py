@@ -25,6 +25,32 @@ class BookReadList(BaseModel):
     _links: dict[str, dict]
 
 
+class BookBulkItemResult(BaseModel):
+    id: str
+    status: int
+    detail: str | None
+
+
+class BookBulkResult(BaseModel):
+    items: list[BookBulkItemResult]
+    created: int
+    failed: int
+
+
 class BookBorrow(BaseModel):
     reader: Annotated[str, StringConstraints(pattern=r"^[0-9]{6}$")]
     borrowing_time: datetime | None = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class BookBatchBorrow(BookBorrow):
+    ids: list[Annotated[str, StringConstraints(pattern=r"^[0-9]{6}$")]] = Field(min_length=1)
+
+
+class BookBatchReturn(BaseModel):
+    ids: list[Annotated[str, StringConstraints(pattern=r"^[0-9]{6}$")]] = Field(min_length=1)
+
+
+class BookBatchResult(BaseModel):
+    items: list[BookBulkItemResult]
+    updated: int
+    failed: int
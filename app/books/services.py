@@ -1,34 +1,221 @@
+from datetime import datetime, timedelta, timezone
 from logging import getLogger
 
-from app.database import PgSession
+from app.database import PgSession, AsyncPgSession
 from app.repositories import CrudRepository
-from app.services import AppService
+from app.services import AppService, AsyncAppService
+from app.utils.pagination import Page
 from app.models import serial_number
+from app.utils.exceptions import (
+    ResourceNotFoundException,
+    ResourceConflictException,
+    handle_exception,
+    handle_exceptions,
+)
 from app.books.models import Book
 from app.books.schemas import BookCreate, BookBorrow
 
+BORROWED_DETAIL = "Book is already borrowed."
+NOT_BORROWED_DETAIL = "Book isn't borrowed."
+
 
 logger = getLogger(__name__)
 
 
 class BookRepository(CrudRepository[Book, BookCreate, BookBorrow]):
-    def update_returned_book(self, db_session: PgSession, originator: Book) -> Book:
-        originator.reader = None
-        originator.borrowing_time = None
+    # every column here is indexed, prefix matches are served by the trigram indexes
+    filter_fields = {
+        "id": ("eq", "in"),
+        "title": ("eq", "prefix"),
+        "author": ("eq", "in", "prefix"),
+        "reader": ("eq", "in"),
+        "borrowing_time": ("gt", "gte", "lt", "lte"),
+    }
+    flag_filters = {"is_borrowed": Book.reader.is_not(None)}
+    # borrowing_time is indexed only for lent books
+    partial_fields = {"borrowing_time": "is_borrowed"}
+    sort_fields = ("id", "title", "author", "reader", "borrowing_time")
+    search_columns = ("title", "author")
+
+    def update_borrowed_book(
+        self,
+        db_session: PgSession,
+        object_id: serial_number,
+        settlement: BookBorrow,
+        versions: tuple[str, ...] | None = None,
+    ) -> Book | None:
+        """Lend the book only if nobody holds it, None otherwise."""
+        return self.update_where(
+            db_session,
+            object_id,
+            settlement.model_dump(),
+            Book.reader.is_(None),
+            *self.version_conditions(versions),
+        )
 
-        db_session.add(originator)
-        db_session.commit()
-        db_session.refresh(originator)
+    def update_returned_book(
+        self,
+        db_session: PgSession,
+        object_id: serial_number,
+        versions: tuple[str, ...] | None = None,
+    ) -> Book | None:
+        """Take the book back only if it's lent, None otherwise."""
+        return self.update_where(
+            db_session,
+            object_id,
+            {"reader": None, "borrowing_time": None},
+            Book.reader.is_not(None),
+            *self.version_conditions(versions),
+        )
 
-        return originator
+    def update_borrowed_books(
+        self, db_session: PgSession, object_ids: list[serial_number], settlement: BookBorrow
+    ) -> list[Book]:
+        """Lend all the books nobody holds in one statement, the rest stays untouched."""
+        return self.update_many_where(
+            db_session, object_ids, settlement.model_dump(exclude={"ids"}), Book.reader.is_(None)
+        )
+
+    def update_returned_books(
+        self, db_session: PgSession, object_ids: list[serial_number]
+    ) -> list[Book]:
+        return self.update_many_where(
+            db_session,
+            object_ids,
+            {"reader": None, "borrowing_time": None},
+            Book.reader.is_not(None),
+        )
 
 
 class BookService(AppService[BookRepository, Book, BookCreate, BookBorrow]):
-    def give_back(self, db_session: PgSession, object_id: serial_number) -> Book | None:
-        if originator := self.get(db_session, object_id):
-            fetched = self.crud.update_returned_book(db_session, originator)
-            self.logger.info(f"Returned book with ID: {fetched.id}.")
-            return fetched
+    @handle_exceptions
+    def borrow(
+        self,
+        db_session: PgSession,
+        object_id: serial_number,
+        settlement: BookBorrow,
+        versions: tuple[str, ...] | None = None,
+    ) -> Book:
+        borrowed = self.crud.update_borrowed_book(db_session, object_id, settlement, versions)
+        if not borrowed:
+            self.raise_write_failure(db_session, object_id, versions, BORROWED_DETAIL)
+        self.invalidate(object_id)
+        self.logger.info("Borrowed book with ID: %s.", borrowed.id)
+        return borrowed
+
+    @handle_exceptions
+    def give_back(
+        self,
+        db_session: PgSession,
+        object_id: serial_number,
+        versions: tuple[str, ...] | None = None,
+    ) -> Book:
+        if not (returned := self.crud.update_returned_book(db_session, object_id, versions)):
+            self.raise_write_failure(db_session, object_id, versions, NOT_BORROWED_DETAIL)
+        self.invalidate(object_id)
+        self.logger.info("Returned book with ID: %s.", returned.id)
+        return returned
+
+    def get_overdue(
+        self, db_session: PgSession, older_than: timedelta, page: int, limit: int
+    ) -> Page[Book]:
+        """Loans older than given time, oldest first, the lent-books partial index serves it."""
+        filters = {
+            "is_borrowed": True,
+            "borrowing_time__lt": datetime.now(timezone.utc) - older_than,
+        }
+        return self.get_all(db_session, filters, page, limit, "borrowing_time")
+
+    @handle_exceptions
+    def borrow_many(
+        self, db_session: PgSession, object_ids: list[serial_number], settlement: BookBorrow
+    ) -> list[dict[str, str | int | None]]:
+        object_ids = list(dict.fromkeys(object_ids))
+        borrowed = self.crud.update_borrowed_books(db_session, object_ids, settlement)
+        results = self.report_batch(db_session, object_ids, borrowed, BORROWED_DETAIL)
+        self.logger.info(
+            "Borrowed %d books in batch, %d rejected.",
+            len(borrowed),
+            len(object_ids) - len(borrowed),
+        )
+        return results
+
+    @handle_exceptions
+    def give_back_many(
+        self, db_session: PgSession, object_ids: list[serial_number]
+    ) -> list[dict[str, str | int | None]]:
+        object_ids = list(dict.fromkeys(object_ids))
+        returned = self.crud.update_returned_books(db_session, object_ids)
+        results = self.report_batch(db_session, object_ids, returned, NOT_BORROWED_DETAIL)
+        self.logger.info(
+            "Returned %d books in batch, %d rejected.",
+            len(returned),
+            len(object_ids) - len(returned),
+        )
+        return results
+
+    def report_batch(
+        self,
+        db_session: PgSession,
+        object_ids: list[serial_number],
+        updated: list[Book],
+        conflict_detail: str,
+    ) -> list[dict[str, str | int | None]]:
+        """Outcome of every requested ID, failed ones are looked up to tell missing from taken."""
+        updated_ids = {book.id for book in updated}
+        self.invalidate(*updated_ids)
+        failed_ids = [object_id for object_id in object_ids if object_id not in updated_ids]
+        existing_ids = self.crud.get_existing_ids(db_session, failed_ids) if failed_ids else set()
+
+        missing = handle_exception(ResourceNotFoundException(self.name), self.name)
+        conflict = handle_exception(
+            ResourceConflictException(self.name, conflict_detail), self.name
+        )
+        results = []
+        for object_id in object_ids:
+            if object_id in updated_ids:
+                results.append({"id": object_id, "status": 200, "detail": None})
+            else:
+                failure = conflict if object_id in existing_ids else missing
+                results.append(
+                    {"id": object_id, "status": failure.status_code, "detail": failure.detail}
+                )
+        return results
+
+
+class AsyncBookService(AsyncAppService[BookService]):
+    async def borrow(
+        self,
+        db_session: AsyncPgSession,
+        object_id: serial_number,
+        settlement: BookBorrow,
+        versions: tuple[str, ...] | None = None,
+    ) -> Book:
+        return await db_session.run_sync(self.service.borrow, object_id, settlement, versions)
+
+    async def give_back(
+        self,
+        db_session: AsyncPgSession,
+        object_id: serial_number,
+        versions: tuple[str, ...] | None = None,
+    ) -> Book:
+        return await db_session.run_sync(self.service.give_back, object_id, versions)
+
+    async def get_overdue(
+        self, db_session: AsyncPgSession, older_than: timedelta, page: int, limit: int
+    ) -> Page[Book]:
+        return await db_session.run_sync(self.service.get_overdue, older_than, page, limit)
+
+    async def borrow_many(
+        self, db_session: AsyncPgSession, object_ids: list[serial_number], settlement: BookBorrow
+    ) -> list[dict[str, str | int | None]]:
+        return await db_session.run_sync(self.service.borrow_many, object_ids, settlement)
+
+    async def give_back_many(
+        self, db_session: AsyncPgSession, object_ids: list[serial_number]
+    ) -> list[dict[str, str | int | None]]:
+        return await db_session.run_sync(self.service.give_back_many, object_ids)
 
 
 book_service = BookService(BookRepository, Book, logger)
+async_book_service = AsyncBookService(book_service)
@@ -1,66 +1,232 @@
-from fastapi import APIRouter, Request, Depends, status
-
-from app.database import PgSession
+from os import remove
+from datetime import timedelta
+from typing import Literal
+from tempfile import NamedTemporaryFile
+
+from fastapi import APIRouter, Request, Depends, Query, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
+
+from app.config import settings
+from app.database import DbSession
 from app.models import serial_number
-from app.utils.api_utils import pagination_params, format_response
+from app.utils.api_utils import (
+    pagination_params,
+    cursor_params,
+    offset_params,
+    filter_params,
+    describe_filters,
+    if_match_params,
+    format_response,
+    resolve,
+)
+from app.utils.export import EXPORT_MEDIA_TYPES, stream_export
+from app.utils.imports import guess_import_format, read_rows
+from app.books.models import Book
 from app.books.schemas import (
     BookCreate,
     BookRead,
     BookReadList,
     BookBorrow,
+    BookBulkResult,
+    BookBatchBorrow,
+    BookBatchReturn,
+    BookBatchResult,
 )
 from app.books.services import book_service
+from app.books.api_utils import service, book_rels
+
 
+FIELDS_DESCRIPTION = "Comma separated fields to return, ID is always included"
 
 router = APIRouter()
-book_rels = [
-    {"rel": "borrow", "method": "PATCH", "overwrite": "update", "endpoint": "/borrow"},
-    {"rel": "return", "method": "POST", "endpoint": "/return"},
-]
+book_filters = filter_params(book_service.crud.filter_names)
+FILTERS_DESCRIPTION = describe_filters(book_service.crud)
+
+
+def book_version(db: DbSession, book_id: serial_number, **_):
+    return service.get_version(db, book_id)
 
 
 @router.post("", response_model=BookRead)
 @format_response(extra_rels=book_rels, status_code=status.HTTP_201_CREATED)
-async def create_book(request: Request, db: PgSession, book: BookCreate):
-    return book_service.create(db, book)
+async def create_book(request: Request, db: DbSession, book: BookCreate):
+    return service.create(db, book)
+
+
+@router.post("/bulk", response_model=BookBulkResult)
+async def create_books(request: Request, db: DbSession, books: list[BookCreate]):
+    results = await resolve(service.create_many(db, books))
+
+    created = sum(1 for result in results if result["status"] == status.HTTP_201_CREATED)
+    failed = len(results) - created
+    return JSONResponse(
+        content={"items": results, "created": created, "failed": failed},
+        status_code=status.HTTP_201_CREATED if not failed else status.HTTP_207_MULTI_STATUS,
+    )
+
+
+def batch_response(results: list[dict]) -> JSONResponse:
+    updated = sum(1 for result in results if result["status"] == status.HTTP_200_OK)
+    failed = len(results) - updated
+    return JSONResponse(
+        content={"items": results, "updated": updated, "failed": failed},
+        status_code=status.HTTP_200_OK if not failed else status.HTTP_207_MULTI_STATUS,
+    )
+
+
+@router.post("/borrow", response_model=BookBatchResult)
+async def borrow_books(request: Request, db: DbSession, settlement: BookBatchBorrow):
+    return batch_response(await resolve(service.borrow_many(db, settlement.ids, settlement)))
+
+
+@router.post("/return", response_model=BookBatchResult)
+async def return_books(request: Request, db: DbSession, batch: BookBatchReturn):
+    return batch_response(await resolve(service.give_back_many(db, batch.ids)))
+
+
+@router.post("/import", response_class=FileResponse)
+async def import_books(
+    request: Request,
+    db: DbSession,
+    file: UploadFile,
+    import_format: Literal["csv", "ndjson"] | None = Query(None, alias="format"),
+):
+    import_format = import_format or guess_import_format(file.filename, file.content_type)
+    rows = read_rows(file.file, import_format)
+
+    report = NamedTemporaryFile("w", suffix=".ndjson", delete=False)
+    try:
+        with report:
+            if settings.db_async:
+                await service.import_rows(db, rows, BookCreate, report)
+            else:
+                # the sync import lasts as long as the upload, it can't hold the event loop
+                await run_in_threadpool(service.import_rows, db, rows, BookCreate, report)
+    except Exception:
+        remove(report.name)
+        raise
+
+    return FileResponse(
+        report.name,
+        media_type=EXPORT_MEDIA_TYPES["ndjson"],
+        background=BackgroundTask(remove, report.name),
+    )
+
+
+@router.get("/export", response_class=StreamingResponse, description=FILTERS_DESCRIPTION)
+async def export_books(
+    request: Request,
+    db: DbSession,
+    filters: dict = Depends(book_filters),
+    sort_by: str | None = None,
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+):
+    books = await resolve(service.stream_all(db, filters, sort_by))
+    return StreamingResponse(
+        stream_export(books, Book, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+    )
+
+
+@router.get("/search", response_model=BookReadList)
+@format_response(
+    extra_rels=book_rels,
+    is_collection=True,
+    status_code=status.HTTP_200_OK,
+    link_params=("q", "item_links"),
+)
+async def search_books(
+    request: Request,
+    db: DbSession,
+    q: str = Query(..., min_length=1, description="Part of a title or an author, typos allowed"),
+    pagination: dict = Depends(cursor_params),
+    item_links: bool = Query(False, description="Add links of every item to the list"),
+):
+    return service.search(db, q, pagination["limit"], pagination["cursor"])
+
+
+@router.get("/overdue", response_model=BookReadList)
+@format_response(
+    extra_rels=book_rels,
+    is_collection=True,
+    status_code=status.HTTP_200_OK,
+    link_params=("older_than", "item_links"),
+)
+async def read_overdue_books(
+    request: Request,
+    db: DbSession,
+    older_than: int = Query(settings.loan_days, ge=0, description="Days since borrowing"),
+    pagination: dict = Depends(offset_params),
+    item_links: bool = Query(False, description="Add links of every item to the list"),
+):
+    return service.get_overdue(
+        db, timedelta(days=older_than), pagination["page"], pagination["limit"]
+    )
 
 
 @router.get("/{book_id}", response_model=BookRead)
-@format_response(extra_rels=book_rels, status_code=status.HTTP_200_OK)
-async def read_book(request: Request, db: PgSession, book_id: serial_number):
-    return book_service.get(db, book_id)
+@format_response(extra_rels=book_rels, status_code=status.HTTP_200_OK, version_lookup=book_version)
+async def read_book(
+    request: Request,
+    db: DbSession,
+    book_id: serial_number,
+    fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
+):
+    return service.get_cached(db, book_id, fields)
 
 
-@router.get("", response_model=BookReadList)
-@format_response(is_collection=True, status_code=status.HTTP_200_OK)
+@router.get("", response_model=BookReadList, description=FILTERS_DESCRIPTION)
+@format_response(
+    extra_rels=book_rels,
+    is_collection=True,
+    status_code=status.HTTP_200_OK,
+    link_params=("filters", "item_links", "total", "fields"),
+)
 async def read_books(
     request: Request,
-    db: PgSession,
-    author: str | None = None,
+    db: DbSession,
+    filters: dict = Depends(book_filters),
     pagination: dict = Depends(pagination_params),
+    item_links: bool = Query(False, description="Add links of every item to the list"),
+    total: Literal["exact", "estimated"] | None = Query(
+        None, description="Add count of all matching books, estimated is cheap on big tables"
+    ),
+    fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
 ):
-    filters: dict[str, str] = {}
-    if author:
-        filters["author"] = author
-
-    return book_service.get_all(db, filters=filters, **pagination)
+    return service.get_all(db, filters=filters, total=total, fields=fields, **pagination)
 
 
 @router.patch("/{book_id}/borrow", response_model=BookRead)
 @format_response(extra_rels=book_rels, status_code=status.HTTP_200_OK)
 async def borrow_book(
-    request: Request, db: PgSession, book_id: serial_number, settlement: BookBorrow
+    request: Request,
+    db: DbSession,
+    book_id: serial_number,
+    settlement: BookBorrow,
+    versions: tuple[str, ...] | None = Depends(if_match_params),
 ):
-    return book_service.update(db, book_id, settlement)
+    return service.borrow(db, book_id, settlement, versions)
 
 
 @router.post("/{book_id}/return", response_model=BookRead)
 @format_response(extra_rels=book_rels, status_code=status.HTTP_200_OK)
-async def return_book(request: Request, db: PgSession, book_id: serial_number):
-    return book_service.give_back(db, book_id)
+async def return_book(
+    request: Request,
+    db: DbSession,
+    book_id: serial_number,
+    versions: tuple[str, ...] | None = Depends(if_match_params),
+):
+    return service.give_back(db, book_id, versions)
 
 
 @router.delete("/{book_id}", response_model=BookRead)
 @format_response(extra_rels=book_rels, status_code=status.HTTP_200_OK)
-async def delete_book(request: Request, db: PgSession, book_id: serial_number):
-    return book_service.delete(db, book_id)
+async def delete_book(
+    request: Request,
+    db: DbSession,
+    book_id: serial_number,
+    versions: tuple[str, ...] | None = Depends(if_match_params),
+):
+    return service.delete(db, book_id, versions)
@@ -1,20 +1,88 @@
 from typing import Annotated
-from collections.abc import Iterator
+from collections.abc import Iterator, AsyncIterator
 
 from fastapi import Depends
 
 from sqlalchemy import create_engine, DateTime, String, Engine, inspect
 from sqlalchemy.orm import DeclarativeBase, declared_attr, Session, sessionmaker
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 
 from app.config import settings
 from app.models import serial_number, datetime_tz
+from app.utils.pool import TimedQueuePool, TimedAsyncQueuePool
+from app.utils.replicas import ReplicaRouter, RoutingSession
+
+
+def engine_options() -> dict:
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "connect_args": {"prepare_threshold": settings.db_prepare_threshold},
+    }
 
 
-engine = create_engine(settings.db_uri, pool_pre_ping=True)
-
-
-def prepare_sessionmaker(engine: Engine) -> sessionmaker:
-    return sessionmaker(autocommit=False, bind=engine)
+engine = create_engine(settings.db_uri, poolclass=TimedQueuePool, **engine_options())
+async_engine = create_async_engine(
+    settings.db_uri, poolclass=TimedAsyncQueuePool, **engine_options()
+)
+replica_engines = [
+    create_engine(uri, poolclass=TimedQueuePool, **engine_options())
+    for uri in settings.db_replica_uris
+]
+async_replica_engines = [
+    create_async_engine(uri, poolclass=TimedAsyncQueuePool, **engine_options())
+    for uri in settings.db_replica_uris
+]
+replicas = ReplicaRouter(replica_engines, settings.db_replica_retry_after)
+async_replicas = ReplicaRouter(
+    [engine.sync_engine for engine in async_replica_engines], settings.db_replica_retry_after
+)
+engines = {
+    "sync": engine,
+    "async": async_engine.sync_engine,
+    **{f"replica_{index}": engine for index, engine in enumerate(replicas.engines)},
+    **{f"async_replica_{index}": engine for index, engine in enumerate(async_replicas.engines)},
+}
+
+
+def prepare_sessionmaker(engine: Engine, replicas: ReplicaRouter | None = None) -> sessionmaker:
+    # writes return their rows, expiring them on commit would cost a SELECT per write
+    if replicas and replicas.engines:
+        return sessionmaker(
+            class_=RoutingSession,
+            replicas=replicas,
+            autocommit=False,
+            bind=engine,
+            expire_on_commit=False,
+        )
+    return sessionmaker(autocommit=False, bind=engine, expire_on_commit=False)
+
+
+def prepare_async_sessionmaker(
+    engine: AsyncEngine, replicas: ReplicaRouter | None = None
+) -> async_sessionmaker:
+    # attributes can't be lazy loaded outside of a greenlet, so keep them after commit
+    if replicas and replicas.engines:
+        return async_sessionmaker(
+            sync_session_class=RoutingSession,
+            replicas=replicas,
+            autocommit=False,
+            bind=engine,
+            expire_on_commit=False,
+        )
+    return async_sessionmaker(autocommit=False, bind=engine, expire_on_commit=False)
+
+
+session_factory = prepare_sessionmaker(engine, replicas)
+async_session_factory = prepare_async_sessionmaker(async_engine, async_replicas)
 
 
 class Base(DeclarativeBase):
@@ -36,10 +104,19 @@ class Base(DeclarativeBase):
     }
 
 
-def get_db() -> Iterator[Session]:
-    db = prepare_sessionmaker(engine)()
-    with db:
+def get_sync_db() -> Iterator[Session]:
+    with session_factory() as db:
         yield db
 
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with async_session_factory() as db:
+        yield db
+
+
+get_db = get_async_db if settings.db_async else get_sync_db
+
 PgSession = Annotated[Session, Depends(get_db)]
+AsyncPgSession = Annotated[AsyncSession, Depends(get_db)]
+# views get whichever session get_db yields, the service of the same mode takes it
+DbSession = Annotated[Session | AsyncSession, Depends(get_db)]
@@ -1,16 +1,34 @@
-from logging import basicConfig, INFO
+from atexit import register
 
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.exceptions import RequestValidationError
 
 from app.config import settings
 from app.api import api_router
+from app.database import engines, replicas, async_replicas
+from app.utils.cache import caches
+from app.utils.metrics import CONTENT_TYPE, MetricsMiddleware, expose, instrument
+from app.utils.pool import pool_status
+from app.utils.profiler import ProfilingMiddleware, StatementProfiler, profile
+from app.utils.replicas import ReadOnlyRequestMiddleware
 from app.utils.exceptions import handle_exception
+from app.utils.logs import setup_logging
 
 
-basicConfig(level=INFO, format="[%(asctime)s - %(name)s] (%(levelname)s) %(message)s")
+log_listener = setup_logging(settings.log_level, settings.log_sample_rate)
+register(log_listener.stop)
 
 api = FastAPI(title="Library API")
+api.add_middleware(ReadOnlyRequestMiddleware)
+if settings.sql_profiling:
+    api.add_middleware(ProfilingMiddleware, n_plus_one_threshold=settings.n_plus_one_threshold)
+api.add_middleware(MetricsMiddleware)
+profiler = StatementProfiler(settings.slow_query_ms)
+for pooled_engine in engines.values():
+    instrument(pooled_engine)
+    if settings.sql_profiling:
+        profiler.instrument(pooled_engine)
 
 
 @api.exception_handler(RequestValidationError)
@@ -23,4 +41,29 @@ async def root():
     return {"message": "Library server is running!"}
 
 
+@api.get("/stats/cache")
+async def cache_stats():
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+@api.get("/stats/pool")
+async def pool_stats():
+    stats = {name: pool_status(engine.pool) for name, engine in engines.items()}
+    for prefix, router in (("replica", replicas), ("async_replica", async_replicas)):
+        for index, engine in enumerate(router.engines):
+            stats[f"{prefix}_{index}"]["ejected"] = router.is_ejected(engine)
+    return stats
+
+
+@api.get("/stats/sql")
+async def sql_stats():
+    """Statements taking the most time since start, recorded with sql_profiling on."""
+    return profile.stats()
+
+
+@api.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(expose(engines), media_type=CONTENT_TYPE)
+
+
 api.include_router(api_router, prefix=settings.api_latest)
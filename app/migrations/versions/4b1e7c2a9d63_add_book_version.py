@@ -0,0 +1,38 @@
+"""add book version
+
+Revision ID: 4b1e7c2a9d63
+Revises: da58370769b8
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4b1e7c2a9d63"
+down_revision: Union[str, None] = "da58370769b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # existing rows get a random version, new ones are versioned by the application
+    op.add_column(
+        "book",
+        sa.Column(
+            "version",
+            sa.String(length=32),
+            server_default=sa.text("md5(random()::text)"),
+            nullable=False,
+        ),
+    )
+    op.alter_column("book", "version", server_default=None)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("book", "version")
@@ -0,0 +1,45 @@
+"""add book trigram indexes
+
+Revision ID: 8c3d5f1e2a74
+Revises: 4b1e7c2a9d63
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c3d5f1e2a74"
+down_revision: Union[str, None] = "4b1e7c2a9d63"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_book_title_trgm",
+        "book",
+        ["title"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"title": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "ix_book_author_trgm",
+        "book",
+        ["author"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"author": "gin_trgm_ops"},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # the extension stays, other objects in the database may rely on it
+    op.drop_index("ix_book_author_trgm", table_name="book")
+    op.drop_index("ix_book_title_trgm", table_name="book")
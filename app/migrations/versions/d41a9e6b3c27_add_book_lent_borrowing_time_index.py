@@ -0,0 +1,37 @@
+"""add book lent borrowing time index
+
+Revision ID: d41a9e6b3c27
+Revises: b7e2d4c8f915
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d41a9e6b3c27"
+down_revision: Union[str, None] = "b7e2d4c8f915"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # free books have no borrowing time, the full index held mostly NULLs
+    op.drop_index(op.f("ix_book_borrowing_time"), table_name="book")
+    op.create_index(
+        "ix_book_borrowing_time_lent",
+        "book",
+        ["borrowing_time"],
+        unique=False,
+        postgresql_where=sa.text("reader IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_book_borrowing_time_lent", table_name="book")
+    op.create_index(op.f("ix_book_borrowing_time"), "book", ["borrowing_time"], unique=False)
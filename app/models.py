@@ -1,5 +1,6 @@
 from datetime import datetime
 from typing import Annotated, Literal, Any
+from uuid import uuid4
 
 from sqlalchemy.orm import MappedColumn, mapped_column
 
@@ -16,3 +17,8 @@ def sql_primary_key[T](col_type: T) -> Annotated[T, MappedColumn[Any]]:
 def sql_index[T](col_type: T) -> Annotated[T, MappedColumn[Any]]:
     """Function to set index using SQLAlchemy ORM"""
     return Annotated[col_type, mapped_column(index=True)]
+
+
+def new_row_version(_: str | None = None) -> str:
+    """Function to generate row version, random so a recreated row never reuses an old one"""
+    return uuid4().hex
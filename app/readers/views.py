@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Request, Depends, Query, status
+
+from app.database import DbSession
+from app.models import serial_number
+from app.utils.api_utils import pagination_params, format_response
+from app.books.schemas import BookReadList
+from app.books.api_utils import service, book_rels
+
+
+router = APIRouter()
+
+
+@router.get("/{reader}/books", response_model=BookReadList)
+@format_response(
+    extra_rels=book_rels,
+    is_collection=True,
+    status_code=status.HTTP_200_OK,
+    link_params=("item_links",),
+)
+async def read_reader_books(
+    request: Request,
+    db: DbSession,
+    reader: serial_number,
+    pagination: dict = Depends(pagination_params),
+    item_links: bool = Query(False, description="Add links of every item to the list"),
+):
+    # books of a reader are all lent, the flag lets them sort by borrowing_time
+    filters = {"reader": reader, "is_borrowed": True}
+    return service.get_all(db, filters=filters, **pagination)
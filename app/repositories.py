@@ -1,9 +1,48 @@
+from functools import cached_property, lru_cache
+from typing import Literal
 from uuid import UUID
 
 from pydantic import BaseModel
-from sqlalchemy.orm import Query
+from sqlalchemy import (
+    ColumnElement,
+    Delete,
+    Double,
+    Select,
+    String,
+    ScalarResult,
+    and_,
+    bindparam,
+    cast,
+    delete,
+    func,
+    insert,
+    not_,
+    or_,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncScalarResult
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import InstrumentedAttribute, load_only
 
-from app.database import Base, PgSession
+from app.database import Base, PgSession, AsyncPgSession
+from app.utils.exceptions import InvalidCursorException, InvalidFilterException
+from app.utils.pagination import parse_cursor_values
+from app.utils.serializers import get_serializer
+from app.utils.filters import (
+    FILTER_OPERATORS,
+    FieldSpec,
+    FilterShape,
+    SortSpec,
+    split_filter_key,
+    parse_fields,
+    parse_sort,
+    parse_flag,
+    parse_filter_value,
+)
 
 
 class CrudRepository[
@@ -11,21 +50,82 @@ class CrudRepository[
     CreateSchemaType: BaseModel,
     UpdateSchemaType: BaseModel,
 ]:
-    """Class to manage database operations."""
+    """Class to manage database operations.
+
+    Writes are single statements with RETURNING, so they don't need a refresh afterwards.
+    """
+
+    # fields indexed only for rows matching a flag filter, usable only together with it
+    partial_fields: dict[str, str] = {}
 
     def __init__(self, model: type[ModelType]):
         self.model = model
+        # every repository caches its own statements, a cache on the class would share
+        # its size among all models and keep every repository alive
+        self.filter_statement = lru_cache(maxsize=256)(self.build_statement)
+        self.get_statement = lru_cache(maxsize=64)(self.build_get_statement)
+        self.search_statement = lru_cache(maxsize=2)(self.build_search_statement)
 
     def create(self, db_session: PgSession, creator: CreateSchemaType) -> ModelType:
         creation_data = creator.model_dump()
-        creation = self.model(**creation_data)
-        db_session.add(creation)
+        statement = insert(self.model).returning(self.model)
+        creation = db_session.scalars(statement, [creation_data]).one()
         db_session.commit()
-        db_session.refresh(creation)
         return creation
 
-    def get(self, db_session: PgSession, object_id: UUID | int) -> ModelType | None:
-        return db_session.query(self.model).filter(self.model.id == object_id).one_or_none()
+    def create_many(
+        self, db_session: PgSession, creators: list[CreateSchemaType], batch_size: int
+    ) -> set[UUID | int]:
+        """Insert rows in executemany batches, skipping the ones whose ID is already taken.
+
+        Returns IDs of inserted rows, the whole load is committed as one transaction.
+        """
+        table = self.model.__table__
+        statement = (
+            pg_insert(table)
+            .on_conflict_do_nothing(index_elements=table.primary_key.columns)
+            .returning(table.c.id)
+        )
+        created = set()
+        for start in range(0, len(creators), batch_size):
+            batch = [creator.model_dump() for creator in creators[start : start + batch_size]]
+            created.update(db_session.scalars(statement, batch))
+        db_session.commit()
+        return created
+
+    def upsert_many(self, db_session: PgSession, creators: list[CreateSchemaType]) -> int:
+        """Insert rows or overwrite the existing ones with the same ID, in one executemany."""
+        if not creators:
+            return 0
+        table = self.model.__table__
+        primary_keys = {column.key for column in table.primary_key.columns}
+        rows = [creator.model_dump() for creator in creators]
+        statement = pg_insert(table)
+        overwritten = {key: statement.excluded[key] for key in rows[0] if key not in primary_keys}
+        if (version_column := inspect(self.model).version_id_col) is not None:
+            # a fresh version is generated for every inserted row, overwritten rows take it too
+            overwritten[version_column.key] = statement.excluded[version_column.key]
+        statement = statement.on_conflict_do_update(
+            index_elements=table.primary_key.columns, set_=overwritten
+        )
+        db_session.execute(statement, rows)
+        db_session.commit()
+        # the upsert bypasses the identity map, so loaded instances may be stale
+        db_session.expire_all()
+        return len(rows)
+
+    def get(
+        self, db_session: PgSession, object_id: UUID | int, fields: str | None = None
+    ) -> ModelType | None:
+        """Fetch the row, with `fields` given only those columns are loaded."""
+        statement = self.get_statement(self.field_spec(fields))
+        return db_session.scalars(statement, {"id": object_id}).one_or_none()
+
+    def get_version(self, db_session: PgSession, object_id: UUID | int) -> str | None:
+        """Fetch only the row version, None when the row or the version column doesn't exist."""
+        if self.version_statement is None:
+            return None
+        return db_session.scalar(self.version_statement, {"id": object_id})
 
     def get_all(
         self,
@@ -34,32 +134,382 @@ class CrudRepository[
         offset: int,
         limit: int,
         sort_by: str | None,
+        after: list | None = None,
+        fields: str | None = None,
     ) -> list[ModelType]:
-        query: Query = db_session.query(self.model)
+        """Fetch a page of rows, by offset or after the given sort key when `after` is set."""
+        params = {"offset": offset, "limit": limit}
+
+        if after is not None:
+            sort_columns = self.sort_columns(sort_by)
+            if any(column.expression.nullable for column, _ in sort_columns):
+                raise InvalidCursorException(
+                    f"Cursor pagination isn't available when sorting by {sort_by}."
+                )
+            if after:
+                after = parse_cursor_values(
+                    after, [column.type.python_type for column, _ in sort_columns]
+                )
+            params.update((f"after_{index}", value) for index, value in enumerate(after))
+            params["offset"] = 0
+
+        statement, filter_params = self.prepare_statement(
+            "page", filters, sort_by, bool(after), self.field_spec(fields)
+        )
+        return db_session.scalars(statement, {**filter_params, **params}).all()
+
+    def stream_all(
+        self,
+        db_session: PgSession,
+        filters: dict[str, str],
+        sort_by: str | None,
+        batch_size: int,
+    ) -> ScalarResult[ModelType]:
+        """Iterate over all matching rows through a server-side cursor, batch by batch."""
+        statement, params = self.prepare_statement("stream", filters, sort_by)
+        return db_session.scalars(statement.execution_options(yield_per=batch_size), params)
+
+    def search(
+        self, db_session: PgSession, phrase: str, limit: int, after: list | None = None
+    ) -> list[tuple[ModelType, float]]:
+        """Rank rows by trigram word similarity of the phrase, best matches first.
+
+        `<%` operator is served by the trigram indexes, so only similar rows get ranked
+        and substrings or typos still match. Keyset is (rank, id), rank descending.
+        """
+        params = {"phrase": phrase, "limit": limit}
+        if after:
+            params["after_rank"], params["after_id"] = parse_cursor_values(
+                after, [float, self.model.id.type.python_type]
+            )
+        statement = self.search_statement(bool(after))
+        return db_session.execute(statement, params).tuples().all()
+
+    def build_search_statement(self, keyset: bool) -> Select:
+        columns = [getattr(self.model, name) for name in self.search_columns]
+        phrase = bindparam("phrase", type_=String)
+        # similarity is a real, which psycopg returns rounded, so cursors would miss the last rank
+        rank = cast(
+            func.greatest(*(func.word_similarity(phrase, column) for column in columns)), Double
+        )
+        statement = (
+            select(self.model, rank.label("rank"))
+            .where(or_(*(phrase.op("<%", is_comparison=True)(column) for column in columns)))
+            .order_by(rank.desc(), self.model.id)
+            .limit(bindparam("limit"))
+        )
+        if keyset:
+            last_rank, last_id = bindparam("after_rank", type_=Double), bindparam("after_id")
+            statement = statement.where(
+                or_(rank < last_rank, and_(rank == last_rank, self.model.id > last_id))
+            )
+        return statement
+
+    def count(self, db_session: PgSession, filters: dict[str, str]) -> int:
+        statement, params = self.prepare_statement("count", filters)
+        return db_session.scalar(statement, params)
+
+    def estimate_count(self, db_session: PgSession, filters: dict[str, str]) -> int:
+        """Row count guessed by Postgres statistics, -1 when the table was never analyzed.
+
+        Unfiltered tables read pg_class.reltuples, filtered ones the planner estimate.
+        """
+        if not filters:
+            return db_session.scalar(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+                {"table": self.model.__tablename__},
+            )
+        statement, params = self.prepare_statement("ids", filters)
+        compiled = statement.params(params).compile(
+            bind=db_session.get_bind(), compile_kwargs={"render_postcompile": True}
+        )
+        plan = (
+            db_session.connection()
+            .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)
+            .scalar()
+        )
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def prepare_statement(
+        self,
+        kind: Literal["page", "stream", "count", "ids"],
+        filters: dict[str, str],
+        sort_by: str | None = None,
+        keyset: bool = False,
+        field_spec: FieldSpec = (),
+    ) -> tuple[Select, dict]:
+        """Validate the filters and sort, return the statement of their shape with its parameters."""
+        shape, params = self.parse_filters(filters)
+        sort_spec = self.sort_spec(sort_by) if kind in ("page", "stream") else ()
+        self.check_partial_fields(shape, sort_spec)
+        return self.filter_statement(kind, shape, sort_spec, keyset, field_spec), params
+
+    def build_statement(
+        self,
+        kind: Literal["page", "stream", "count", "ids"],
+        shape: FilterShape,
+        sort_spec: SortSpec,
+        keyset: bool,
+        field_spec: FieldSpec = (),
+    ) -> Select:
+        """Statements are built once per shape, values come as bound parameters on execution."""
+        conditions = [self.filter_condition(*filter_shape) for filter_shape in shape]
+        if kind == "count":
+            return select(func.count()).select_from(self.model).where(*conditions)
+        if kind == "ids":
+            return select(self.model.id).where(*conditions)
+
+        sort_columns = self.resolve_sort(sort_spec)
+        statement = (
+            select(self.model)
+            .where(*conditions)
+            .order_by(
+                *(column.desc() if descending else column for column, descending in sort_columns)
+            )
+        )
+        if keyset:
+            statement = statement.where(self.keyset_filter(sort_columns))
+        if field_spec:
+            # cursors are built from the sort columns, so they are loaded too
+            sorted_fields = tuple(field for field, _ in sort_spec)
+            statement = statement.options(self.load_fields(field_spec + sorted_fields))
+        if kind == "page":
+            statement = statement.offset(bindparam("offset")).limit(bindparam("limit"))
+        return statement
+
+    def parse_filters(self, filters: dict[str, str]) -> tuple[FilterShape, dict]:
+        shape, params = [], {}
+        for key, value in filters.items():
+            field, operator = split_filter_key(key)
+            if field in self.flag_filters and operator == "eq":
+                shape.append((field, operator, parse_flag(key, value)))
+                continue
+            if operator not in self.filter_fields.get(field, ()):
+                raise InvalidFilterException(f"Filtering by {key} isn't supported.")
+            column = getattr(self.model, field)
+            params[f"{field}_{operator}"] = parse_filter_value(key, column, operator, value)
+            shape.append((field, operator, None))
+        # the same filters in another order share the statement
+        return tuple(sorted(shape)), params
+
+    def check_partial_fields(self, shape: FilterShape, sort_spec: SortSpec) -> None:
+        """Without the flag filter a partially indexed field would need a full table scan."""
+        flags = {field for field, _, flag in shape if flag}
+        used = {field for field, _, _ in shape} | {field for field, _ in sort_spec}
+        for field in sorted(used):
+            if (flag := self.partial_fields.get(field)) and flag not in flags:
+                raise InvalidFilterException(f"Filtering or sorting by {field} needs {flag}=true.")
+
+    def filter_condition(self, field: str, operator: str, flag: bool | None) -> ColumnElement[bool]:
+        if flag is not None:
+            condition = self.flag_filters[field]
+            return condition if flag else not_(condition)
+        column = getattr(self.model, field)
+        value = bindparam(f"{field}_{operator}", type_=column.type, expanding=operator == "in")
+        return FILTER_OPERATORS[operator](column, value)
+
+    def sort_spec(self, sort_by: str | None) -> SortSpec:
+        """Primary key breaks ties, so every row has a unique position in the ordering."""
+        sort_spec = parse_sort(sort_by)
+        for field, _ in sort_spec:
+            if field not in self.sort_fields:
+                raise InvalidFilterException(f"Sorting by {field} isn't supported.")
+        if "id" not in (field for field, _ in sort_spec):
+            sort_spec += (("id", False),)
+        return sort_spec
 
-        for field, value in filters.items():
-            query = query.filter(getattr(self.model, field) == value)
+    def resolve_sort(self, sort_spec: SortSpec) -> list[tuple[InstrumentedAttribute, bool]]:
+        return [(getattr(self.model, field), descending) for field, descending in sort_spec]
 
-        if sort_by:
-            query = query.order_by(getattr(self.model, sort_by))
+    def sort_columns(self, sort_by: str | None) -> list[tuple[InstrumentedAttribute, bool]]:
+        return self.resolve_sort(self.sort_spec(sort_by))
 
-        return query.offset(offset).limit(limit).all()
+    def sort_key(self, instance: ModelType, sort_by: str | None) -> list:
+        return [getattr(instance, column.key) for column, _ in self.sort_columns(sort_by)]
+
+    @staticmethod
+    def keyset_filter(
+        sort_columns: list[tuple[InstrumentedAttribute, bool]],
+    ) -> ColumnElement[bool]:
+        """Rows after the `after_<n>` bound parameters in the given ordering."""
+        columns = [column for column, _ in sort_columns]
+        after = [
+            bindparam(f"after_{index}", type_=column.type) for index, column in enumerate(columns)
+        ]
+        directions = {descending for _, descending in sort_columns}
+        if len(directions) == 1:
+            descending = directions.pop()
+            if len(columns) == 1:
+                return columns[0] < after[0] if descending else columns[0] > after[0]
+            # the leading column bound lets Postgres use a single-column index on it
+            if descending:
+                return and_(columns[0] <= after[0], tuple_(*columns) < tuple_(*after))
+            return and_(columns[0] >= after[0], tuple_(*columns) > tuple_(*after))
+        # row values can't compare in mixed directions, every column gets its own branch
+        return or_(
+            *(
+                and_(
+                    *(previous == value for previous, value in zip(columns[:index], after)),
+                    column < after[index] if descending else column > after[index],
+                )
+                for index, (column, descending) in enumerate(sort_columns)
+            )
+        )
+
+    def field_spec(self, fields: str | None) -> FieldSpec:
+        """Validate requested fields against the serialized columns of the model."""
+        field_spec = parse_fields(fields)
+        serialized = get_serializer(self.model).keys
+        for field in field_spec:
+            if field not in serialized:
+                raise InvalidFilterException(f"Field {field} isn't available.")
+        return field_spec
+
+    def load_fields(self, fields: tuple[str, ...]):
+        """Load only the given columns, the row version stays loaded for ETags."""
+        columns = {getattr(self.model, field) for field in fields}
+        if (version_column := inspect(self.model).version_id_col) is not None:
+            columns.add(getattr(self.model, version_column.key))
+        return load_only(*columns)
+
+    def build_get_statement(self, field_spec: FieldSpec = ()) -> Select:
+        """Statements of the single row queries are built once per repository and fields.
+
+        Their SQL text never changes, so psycopg prepares them server-side after a few runs.
+        """
+        statement = select(self.model).where(self.model.id == bindparam("id"))
+        if field_spec:
+            statement = statement.options(self.load_fields(field_spec))
+        return statement
+
+    @cached_property
+    def version_statement(self) -> Select | None:
+        if (version_column := inspect(self.model).version_id_col) is None:
+            return None
+        return select(version_column).where(self.model.id == bindparam("id"))
+
+    @cached_property
+    def existing_ids_statement(self) -> Select:
+        return select(self.model.id).where(self.model.id.in_(bindparam("ids", expanding=True)))
+
+    @cached_property
+    def delete_statement(self) -> Delete:
+        return delete(self.model).where(self.model.id == bindparam("id")).returning(self.model)
+
+    @property
+    def filter_names(self) -> set[str]:
+        return set(self.filter_fields) | set(self.flag_filters)
 
     def update(
         self,
         db_session: PgSession,
-        originator: ModelType,
+        object_id: UUID | int,
         updater: UpdateSchemaType,
-    ) -> ModelType:
+        versions: tuple[str, ...] | None = None,
+    ) -> ModelType | None:
         updater_data = updater.model_dump(exclude_none=True)
-        for field_name, field_value in updater_data.items():
-            setattr(originator, field_name, field_value)
-        db_session.add(originator)
+        return self.update_where(
+            db_session, object_id, updater_data, *self.version_conditions(versions)
+        )
+
+    def update_where(
+        self,
+        db_session: PgSession,
+        object_id: UUID | int,
+        values: dict,
+        *conditions: ColumnElement[bool],
+    ) -> ModelType | None:
+        """Update the row in a single UPDATE ... RETURNING, only when it meets the conditions.
+
+        Check and write are one statement, so concurrent requests can't both pass the check.
+        None means that no row matched, either missing or failing the conditions.
+        """
+        values = self.with_new_version(values)
+        statement = (
+            update(self.model)
+            .where(self.model.id == object_id, *conditions)
+            .values(values)
+            .returning(self.model)
+            # loaded instances take the values as the database stored them
+            .execution_options(populate_existing=True)
+        )
+        updated = db_session.scalars(statement).one_or_none()
         db_session.commit()
-        db_session.refresh(originator)
-        return originator
+        return updated
 
-    def delete(self, db_session: PgSession, originator: ModelType) -> ModelType:
-        db_session.delete(originator)
+    def update_many_where(
+        self,
+        db_session: PgSession,
+        object_ids: list[UUID | int],
+        values: dict,
+        *conditions: ColumnElement[bool],
+    ) -> list[ModelType]:
+        """Set-based variant of update_where, all matching rows change in one statement."""
+        values = self.with_new_version(values)
+        statement = (
+            update(self.model)
+            .where(self.model.id.in_(object_ids), *conditions)
+            .values(values)
+            .returning(self.model)
+            .execution_options(populate_existing=True)
+        )
+        updated = db_session.scalars(statement).all()
         db_session.commit()
-        return originator
+        return updated
+
+    def get_existing_ids(
+        self, db_session: PgSession, object_ids: list[UUID | int]
+    ) -> set[UUID | int]:
+        return set(db_session.scalars(self.existing_ids_statement, {"ids": list(object_ids)}))
+
+    def version_conditions(
+        self, versions: tuple[str, ...] | None
+    ) -> tuple[ColumnElement[bool], ...]:
+        """Conditions of a write expecting the row in one of the versions, None expects any."""
+        if versions is None or (version_column := inspect(self.model).version_id_col) is None:
+            return ()
+        return (version_column.in_(versions),)
+
+    def with_new_version(self, values: dict) -> dict:
+        """Core UPDATE statements bypass the ORM, which would rotate the row version itself."""
+        mapper = inspect(self.model)
+        if mapper.version_id_col is None:
+            return values
+        return {**values, mapper.version_id_col.key: mapper.version_id_generator(None)}
+
+    def delete(
+        self,
+        db_session: PgSession,
+        object_id: UUID | int,
+        versions: tuple[str, ...] | None = None,
+    ) -> ModelType | None:
+        """Delete the row in a single DELETE ... RETURNING, None when no row matched."""
+        statement = self.delete_statement
+        if conditions := self.version_conditions(versions):
+            statement = statement.where(*conditions)
+        deleted = db_session.scalars(statement, {"id": object_id}).one_or_none()
+        db_session.commit()
+        return deleted
+
+
+class AsyncCrudRepository[CrudModelType: CrudRepository]:
+    """Class to stream CrudRepository queries on an AsyncSession.
+
+    Other operations run through AsyncAppService, which hands the sync service to `run_sync`.
+    """
+
+    def __init__(self, repository: CrudModelType):
+        self.repository = repository
+        self.model = repository.model
+
+    async def stream_all(
+        self,
+        db_session: AsyncPgSession,
+        filters: dict[str, str],
+        sort_by: str | None,
+        batch_size: int,
+    ) -> AsyncScalarResult[Base]:
+        statement, params = self.repository.prepare_statement("stream", filters, sort_by)
+        return await db_session.stream_scalars(
+            statement.execution_options(yield_per=batch_size), params
+        )
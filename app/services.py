@@ -1,11 +1,27 @@
 from uuid import UUID
+from json import dumps
 from logging import Logger
+from typing import Literal, NoReturn, TextIO
+from collections.abc import Iterable, AsyncIterable
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
-from app.database import Base, PgSession
-from app.repositories import CrudRepository
-from app.utils.exceptions import ResourceNotFoundException, handle_exceptions
+from app.config import settings
+from app.database import Base, PgSession, AsyncPgSession
+from app.repositories import CrudRepository, AsyncCrudRepository
+from app.utils.exceptions import (
+    ResourceNotFoundException,
+    ResourceExistsException,
+    ResourceConflictException,
+    PreconditionFailedException,
+    handle_exception,
+    handle_exceptions,
+    describe_validation_error,
+)
+from app.utils.cache import TTLCache, register_cache
+from app.utils.imports import ImportRow
+from app.utils.pagination import Page, encode_cursor, decode_cursor
+from app.utils.serializers import SerializedRow, get_serializer
 
 
 class AppService[
@@ -25,23 +41,155 @@ class AppService[
         self.crud = crud_model(model)
         self.name = self.crud.model.__name__.lower()
         self.logger = log
+        self.cache = (
+            register_cache(TTLCache(self.name, settings.cache_size, settings.cache_ttl))
+            if settings.cache_enabled
+            else None
+        )
+        self.counts = register_cache(
+            TTLCache(f"{self.name}_count", settings.cache_size, settings.count_cache_ttl)
+        )
+
+    def invalidate(self, *object_ids: UUID | int) -> None:
+        if self.cache:
+            self.cache.invalidate(*((self.name, object_id) for object_id in object_ids))
+        # any write may move rows in or out of some filters, counts are cheap to recompute
+        self.counts.clear()
 
     @handle_exceptions
     def create(self, db_session: PgSession, creator: CreateSchemaType) -> ModelType:
         creation = self.crud.create(db_session, creator)
-        self.logger.info(f"Created {self.name} with ID: {creation.id}.")
+        self.invalidate(creation.id)
+        self.logger.info("Created %s with ID: %s.", self.name, creation.id)
         return creation
 
+    @handle_exceptions
+    def create_many(
+        self, db_session: PgSession, creators: list[CreateSchemaType]
+    ) -> list[dict[str, str | int | None]]:
+        """Create objects in batches and report outcome of every item in the payload order."""
+        unique_creators, seen_ids = [], set()
+        for creator in creators:
+            if creator.id not in seen_ids:
+                seen_ids.add(creator.id)
+                unique_creators.append(creator)
+
+        created_ids = self.crud.create_many(db_session, unique_creators, settings.bulk_batch_size)
+        self.invalidate(*created_ids)
+
+        duplicate = handle_exception(ResourceExistsException(self.name), self.name)
+        results, reported_ids = [], set()
+        for creator in creators:
+            if creator.id in created_ids and creator.id not in reported_ids:
+                results.append({"id": creator.id, "status": 201, "detail": None})
+            else:
+                results.append(
+                    {"id": creator.id, "status": duplicate.status_code, "detail": duplicate.detail}
+                )
+            reported_ids.add(creator.id)
+
+        self.logger.info(
+            "Created %d %ss in bulk, %d rejected as duplicates.",
+            len(created_ids),
+            self.name,
+            len(creators) - len(created_ids),
+        )
+        return results
+
+    @handle_exceptions
+    def import_rows(
+        self,
+        db_session: PgSession,
+        rows: Iterable[ImportRow],
+        creator_schema: type[CreateSchemaType],
+        report: TextIO,
+    ) -> dict[str, int]:
+        """Validate rows chunk by chunk and upsert them, every chunk in its own transaction.
+
+        Errors of single rows and progress after every chunk are written to the report
+        as JSON lines, the last line holds the summary. Rows overwritten by a later row
+        with the same ID in the same chunk are counted apart from the upserted ones.
+        """
+        summary = {"processed": 0, "upserted": 0, "overwritten": 0, "failed": 0}
+        chunk: dict[UUID | int, CreateSchemaType] = {}
+
+        for line_number, row in rows:
+            summary["processed"] += 1
+            try:
+                if isinstance(row, ValueError):
+                    raise row
+                creator = creator_schema.model_validate(row)
+            except ValueError as exc:
+                detail = (
+                    describe_validation_error(exc) if isinstance(exc, ValidationError) else str(exc)
+                )
+                summary["failed"] += 1
+                report.write(dumps({"line": line_number, "error": detail}) + "\n")
+                continue
+
+            # later rows win, Postgres can't upsert the same row twice in one statement
+            if creator.id in chunk:
+                summary["overwritten"] += 1
+            chunk[creator.id] = creator
+            if len(chunk) >= settings.import_chunk_size:
+                summary["upserted"] += self.crud.upsert_many(db_session, list(chunk.values()))
+                self.invalidate(*chunk)
+                chunk = {}
+                report.write(dumps({"progress": summary}) + "\n")
+
+        summary["upserted"] += self.crud.upsert_many(db_session, list(chunk.values()))
+        self.invalidate(*chunk)
+        report.write(dumps({"summary": summary}) + "\n")
+
+        self.logger.info(
+            "Imported %d %ss, %d rows rejected.", summary["upserted"], self.name, summary["failed"]
+        )
+        return summary
+
     @handle_exceptions
     def get(
-        self, db_session: PgSession, object_id: UUID | int, raise_404: bool = True
+        self,
+        db_session: PgSession,
+        object_id: UUID | int,
+        raise_404: bool = True,
+        fields: str | None = None,
     ) -> ModelType:
-        if not (fetched := self.crud.get(db_session, object_id)) and raise_404:
+        if not (fetched := self.crud.get(db_session, object_id, fields)) and raise_404:
             raise ResourceNotFoundException(self.name)
         if raise_404:
-            self.logger.info(f"Fetched {self.name} with ID: {fetched.id}.")
+            self.logger.info("Fetched %s with ID: %s.", self.name, fetched.id)
+        return fetched
+
+    @handle_exceptions
+    def check_fields(self, fields: str | None) -> None:
+        self.crud.field_spec(fields)
+
+    def get_cached(
+        self, db_session: PgSession, object_id: UUID | int, fields: str | None = None
+    ) -> ModelType | SerializedRow:
+        """Read-through variant of get, which keeps serialized rows in the service cache.
+
+        Whole rows are cached, sparse fields are picked from them when serializing.
+        """
+        if not self.cache:
+            return self.get(db_session, object_id, fields=fields)
+        self.check_fields(fields)
+        if (cached := self.cache.get((self.name, object_id))) is not None:
+            self.logger.info("Fetched %s with ID: %s from cache.", self.name, object_id)
+            return cached
+        fetched = get_serializer(self.crud.model).to_row(self.get(db_session, object_id))
+        self.cache.set((self.name, object_id), fetched)
         return fetched
 
+    def get_version(self, db_session: PgSession, object_id: UUID | int) -> str | None:
+        """Current row version, from the cache when possible, without loading the whole row.
+
+        Good enough for If-None-Match of reads, writes check the version in their statement.
+        """
+        if self.cache and (cached := self.cache.get((self.name, object_id))) is not None:
+            return cached.version
+        return self.crud.get_version(db_session, object_id)
+
     @handle_exceptions
     def get_all(
         self,
@@ -51,30 +199,213 @@ class AppService[
         limit: int,
         sort_by: str | None,
         raise_404: bool = False,
-    ) -> list[ModelType]:
+        cursor: str | None = None,
+        total: Literal["exact", "estimated"] | None = None,
+        fields: str | None = None,
+    ) -> Page[ModelType]:
         offset = max((page - 1), 0) * limit
-        fetched = self.crud.get_all(db_session, filters, offset, limit, sort_by)
+        after = None if cursor is None else decode_cursor(cursor, sort_by)
+        # one extra row tells whether the next page exists
+        fetched = self.crud.get_all(db_session, filters, offset, limit + 1, sort_by, after, fields)
+        has_next = len(fetched) > limit
+        fetched = Page(fetched[:limit], has_next)
 
         if not fetched and raise_404:
             raise ResourceNotFoundException(self.name)
 
-        self.logger.info(f"Fetched {len(fetched)} {self.name}s. Filters used: {filters}.")
+        if cursor is not None and has_next:
+            fetched.next_cursor = encode_cursor(sort_by, self.crud.sort_key(fetched[-1], sort_by))
+
+        if total is not None:
+            fetched.total, fetched.total_estimated = self.count(db_session, filters, total)
+
+        self.logger.info("Fetched %d %ss. Filters used: %s.", len(fetched), self.name, filters)
+
+        return fetched
+
+    @handle_exceptions
+    def search(
+        self, db_session: PgSession, phrase: str, limit: int, cursor: str = ""
+    ) -> Page[ModelType]:
+        # cursor is bound to the phrase, it can't continue a different search
+        cursor_key = f"search:{phrase}"
+        after = decode_cursor(cursor, cursor_key)
+        found = self.crud.search(db_session, phrase, limit + 1, after)
+        has_next = len(found) > limit
+        fetched = Page([instance for instance, _ in found[:limit]], has_next)
+
+        if has_next:
+            last, rank = found[limit - 1]
+            fetched.next_cursor = encode_cursor(cursor_key, [rank, last.id])
 
+        self.logger.info("Found %d %ss for phrase: %s.", len(fetched), self.name, phrase)
         return fetched
 
+    def count(
+        self, db_session: PgSession, filters: dict[str, str], mode: Literal["exact", "estimated"]
+    ) -> tuple[int, bool]:
+        """Count matching rows, estimated mode counts exactly only when the estimate is small.
+
+        Returns the count and whether it's an estimate, cached per filter combination.
+        """
+        key = (mode, tuple(sorted(filters.items())))
+        if (counted := self.counts.get(key)) is not None:
+            return counted
+        counted = None
+        if mode == "estimated":
+            estimate = self.crud.estimate_count(db_session, filters)
+            if estimate >= settings.exact_count_threshold:
+                counted = (estimate, True)
+        if counted is None:
+            counted = (self.crud.count(db_session, filters), False)
+        self.counts.set(key, counted)
+        return counted
+
+    @handle_exceptions
+    def stream_all(
+        self, db_session: PgSession, filters: dict[str, str], sort_by: str | None
+    ) -> Iterable[ModelType]:
+        streamed = self.crud.stream_all(db_session, filters, sort_by, settings.export_batch_size)
+        self.logger.info("Streaming %ss. Filters used: %s.", self.name, filters)
+        return streamed
+
+    @handle_exceptions
     def update(
         self,
         db_session: PgSession,
         object_id: UUID | int,
         updater: UpdateSchemaType,
+        versions: tuple[str, ...] | None = None,
+    ) -> ModelType:
+        if not (updated := self.crud.update(db_session, object_id, updater, versions)):
+            self.raise_write_failure(db_session, object_id, versions)
+        self.invalidate(object_id)
+        self.logger.info("Updated %s with ID: %s.", self.name, updated.id)
+        return updated
+
+    @handle_exceptions
+    def delete(
+        self,
+        db_session: PgSession,
+        object_id: UUID | int,
+        versions: tuple[str, ...] | None = None,
     ) -> ModelType:
-        if originator := self.get(db_session, object_id):
-            fetched = self.crud.update(db_session, originator, updater)
-            self.logger.info(f"Updated {self.name} with ID: {fetched.id}.")
-            return fetched
-
-    def delete(self, db_session: PgSession, object_id: UUID | int) -> ModelType:
-        if originator := self.get(db_session, object_id):
-            deleted = self.crud.delete(db_session, originator)
-            self.logger.info(f"Deleted {self.name} with ID: {deleted.id}.")
-            return deleted
+        if not (deleted := self.crud.delete(db_session, object_id, versions)):
+            self.raise_write_failure(db_session, object_id, versions)
+        self.invalidate(object_id)
+        self.logger.info("Deleted %s with ID: %s.", self.name, deleted.id)
+        return deleted
+
+    def raise_write_failure(
+        self,
+        db_session: PgSession,
+        object_id: UUID | int,
+        versions: tuple[str, ...] | None,
+        conflict_detail: str | None = None,
+    ) -> NoReturn:
+        """Tell why a write matched no row, looked up in the database only after it failed.
+
+        A changed version wins over the row state, the client wrote against a stale copy.
+        """
+        version = self.crud.get_version(db_session, object_id)
+        if version is None and self.crud.get(db_session, object_id) is None:
+            raise ResourceNotFoundException(self.name)
+        if versions is not None and version not in versions:
+            raise PreconditionFailedException(self.name)
+        raise ResourceConflictException(self.name, conflict_detail)
+
+
+class AsyncAppService[ServiceType: AppService]:
+    """Class to expose AppService operations to API views running on an AsyncSession."""
+
+    def __init__(
+        self,
+        service: ServiceType,
+        async_crud_model: type[AsyncCrudRepository] = AsyncCrudRepository,
+    ):
+        self.service = service
+        self.crud = async_crud_model(service.crud)
+        self.name = service.name
+        self.logger = service.logger
+
+    async def create(self, db_session: AsyncPgSession, creator: BaseModel) -> Base:
+        return await db_session.run_sync(self.service.create, creator)
+
+    async def create_many(
+        self, db_session: AsyncPgSession, creators: list[BaseModel]
+    ) -> list[dict[str, str | int | None]]:
+        return await db_session.run_sync(self.service.create_many, creators)
+
+    async def import_rows(
+        self,
+        db_session: AsyncPgSession,
+        rows: Iterable[ImportRow],
+        creator_schema: type[BaseModel],
+        report: TextIO,
+    ) -> dict[str, int]:
+        return await db_session.run_sync(self.service.import_rows, rows, creator_schema, report)
+
+    async def get(
+        self,
+        db_session: AsyncPgSession,
+        object_id: UUID | int,
+        raise_404: bool = True,
+        fields: str | None = None,
+    ) -> Base:
+        return await db_session.run_sync(self.service.get, object_id, raise_404, fields)
+
+    async def get_cached(
+        self, db_session: AsyncPgSession, object_id: UUID | int, fields: str | None = None
+    ) -> Base | SerializedRow:
+        return await db_session.run_sync(self.service.get_cached, object_id, fields)
+
+    async def get_version(self, db_session: AsyncPgSession, object_id: UUID | int) -> str | None:
+        return await db_session.run_sync(self.service.get_version, object_id)
+
+    async def get_all(
+        self,
+        db_session: AsyncPgSession,
+        filters: dict[str, str],
+        page: int,
+        limit: int,
+        sort_by: str | None,
+        raise_404: bool = False,
+        cursor: str | None = None,
+        total: Literal["exact", "estimated"] | None = None,
+        fields: str | None = None,
+    ) -> Page[Base]:
+        return await db_session.run_sync(
+            self.service.get_all, filters, page, limit, sort_by, raise_404, cursor, total, fields
+        )
+
+    async def search(
+        self, db_session: AsyncPgSession, phrase: str, limit: int, cursor: str = ""
+    ) -> Page[Base]:
+        return await db_session.run_sync(self.service.search, phrase, limit, cursor)
+
+    @handle_exceptions
+    async def stream_all(
+        self, db_session: AsyncPgSession, filters: dict[str, str], sort_by: str | None
+    ) -> AsyncIterable[Base]:
+        streamed = await self.crud.stream_all(
+            db_session, filters, sort_by, settings.export_batch_size
+        )
+        self.logger.info("Streaming %ss. Filters used: %s.", self.name, filters)
+        return streamed
+
+    async def update(
+        self,
+        db_session: AsyncPgSession,
+        object_id: UUID | int,
+        updater: BaseModel,
+        versions: tuple[str, ...] | None = None,
+    ) -> Base:
+        return await db_session.run_sync(self.service.update, object_id, updater, versions)
+
+    async def delete(
+        self,
+        db_session: AsyncPgSession,
+        object_id: UUID | int,
+        versions: tuple[str, ...] | None = None,
+    ) -> Base:
+        return await db_session.run_sync(self.service.delete, object_id, versions)
@@ -1,36 +1,172 @@
 from functools import wraps
+from inspect import isawaitable
+from time import perf_counter
+from collections.abc import Awaitable, Callable, Iterable
 
-from fastapi import Query
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi import Header, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse
 
 from app.config import settings
+from app.repositories import CrudRepository
+from app.utils.etags import make_etag, item_etag, collection_etag, etag_matches, etag_versions
+from app.utils.filters import parse_fields
 from app.utils.hateoas import get_hateoas_item, get_hateoas_list
+from app.utils.metrics import record_serialize
 
 
 def pagination_params(
     page: int = Query(1, ge=1),
     limit: int = Query(settings.paging_limit, ge=1),
-    sort_by: str | None = None,
+    sort_by: str | None = Query(None, description="Comma separated, minus sorts descending"),
+    cursor: str | None = Query(None, description="Opaque cursor, pass it empty to start"),
 ) -> dict[str, str]:
-    return {"page": page, "limit": limit, "sort_by": sort_by}
+    return {"page": page, "limit": limit, "sort_by": sort_by, "cursor": cursor}
 
 
-def format_response(extra_rels: dict = {}, is_collection: bool = False, status_code: int = 200):
+def filter_params(fields: Iterable[str]) -> Callable[[Request], dict[str, str]]:
+    """Dependency collecting `field` and `field__operator` query parameters of the given fields."""
+    fields = frozenset(fields)
+
+    def dependency(request: Request) -> dict[str, str]:
+        return {
+            key: value
+            for key, value in request.query_params.items()
+            if key.partition("__")[0] in fields
+        }
+
+    return dependency
+
+
+def describe_filters(crud: CrudRepository) -> str:
+    """Route description of the allowlisted filters and sorts.
+
+    `filter_params` reads them from the raw query, so they aren't listed among the parameters.
+    """
+    lines = [
+        "Filter by `field=value` or `field__operator=value`, `in` takes a comma separated list.",
+        "",
+    ]
+    lines += [
+        f"- `{field}`: {', '.join(operators)}" for field, operators in crud.filter_fields.items()
+    ]
+    lines += [f"- `{field}`: true or false" for field in crud.flag_filters]
+    lines.append(f"\n`sort_by` takes {', '.join(f'`{field}`' for field in crud.sort_fields)}.")
+    lines += [
+        f"\nFiltering or sorting by `{field}` needs `{flag}=true`."
+        for field, flag in crud.partial_fields.items()
+    ]
+    return "\n".join(lines)
+
+
+def if_match_params(
+    if_match: str | None = Header(None, description="ETag of the row the write expects"),
+) -> tuple[str, ...] | None:
+    """Row versions a conditional write expects, None when any version will do.
+
+    Versions go into the WHERE clause of the write, so check and write are one statement.
+    """
+    return etag_versions(if_match) if if_match else None
+
+
+def offset_params(
+    page: int = Query(1, ge=1),
+    limit: int = Query(settings.paging_limit, ge=1),
+) -> dict[str, str]:
+    """Pagination of results in a fixed order, which can't be sorted by the client."""
+    return {"page": page, "limit": limit, "sort_by": None, "cursor": None}
+
+
+def cursor_params(
+    limit: int = Query(settings.paging_limit, ge=1),
+    cursor: str = Query("", description="Opaque cursor, empty for the first page"),
+) -> dict[str, str]:
+    """Pagination of results which have no stable offset, e.g. ranked search."""
+    return {"page": 1, "limit": limit, "sort_by": None, "cursor": cursor}
+
+
+async def resolve[T](result: T | Awaitable[T]) -> T:
+    """Await results of async services and pass results of sync ones through."""
+    return await result if isawaitable(result) else result
+
+
+def link_query(kwargs: dict, link_params: tuple[str, ...]) -> dict[str, str]:
+    """Query parameters kept in page links, dict arguments like filters are spread."""
+    params = {}
+    for name in link_params:
+        if isinstance(value := kwargs.get(name), dict):
+            params.update(value)
+        elif value:
+            params[name] = value
+    return params
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def format_response(
+    extra_rels: dict = {},
+    is_collection: bool = False,
+    status_code: int = 200,
+    version_lookup: Callable[..., str | None | Awaitable[str | None]] | None = None,
+    link_params: tuple[str, ...] = (),
+):
+    """Wrap the view result in HATEOAS links and an ETag.
+
+    Collection links point at the requested path and keep the view arguments named
+    in `link_params`, so filters survive paging. A `fields` view argument limits
+    the serialized columns.
+
+    With `version_lookup`, which gets the view arguments and returns the current row
+    version, If-None-Match of GET is checked before the view runs. If-Match of writes
+    is left to the views, see `if_match_params`.
+    """
+
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            base_url = str(kwargs.get("request").base_url).rstrip("/")
-            full_url = str(kwargs.get("request").url)
-            result = await func(*args, **kwargs)
+            request = kwargs.get("request")
+            base_url = str(request.base_url).rstrip("/")
+            full_url = str(request.url)
+            if_none_match = request.headers.get("if-none-match")
+
+            fields = parse_fields(kwargs.get("fields"))
+            is_read = request.method in ("GET", "HEAD")
+            if version_lookup and is_read and if_none_match:
+                version = await resolve(version_lookup(**kwargs))
+                current = make_etag(version, fields) if version is not None else None
+                if etag_matches(if_none_match, current, weak=True):
+                    return not_modified(current)
+
+            result = await resolve(await func(*args, **kwargs))
+            started = perf_counter()
             if is_collection:
+                etag = collection_etag(result, full_url)
+                if is_read and etag_matches(if_none_match, etag, weak=True):
+                    return not_modified(etag)
                 pagination = kwargs["pagination"]
                 page = int(pagination.get("page", 1))
                 limit = int(pagination.get("limit", settings.paging_limit))
-                formatted = get_hateoas_list(result, page, limit, base_url)
+                formatted = get_hateoas_list(
+                    result,
+                    page,
+                    limit,
+                    base_url,
+                    sort_by=pagination.get("sort_by"),
+                    cursor=pagination.get("cursor"),
+                    extra_rels=extra_rels,
+                    item_links=kwargs.get("item_links", False),
+                    collection_url=f"{base_url}{request.url.path}",
+                    params=link_query(kwargs, link_params),
+                    fields=fields,
+                )
             else:
-                formatted = get_hateoas_item(result, base_url, full_url, extra_rels)
-            return JSONResponse(content=jsonable_encoder(formatted), status_code=status_code)
+                etag = item_etag(result, fields)
+                formatted = get_hateoas_item(result, base_url, full_url, extra_rels, fields)
+            headers = {"ETag": etag} if etag else None
+            response = ORJSONResponse(content=formatted, status_code=status_code, headers=headers)
+            record_serialize(perf_counter() - started)
+            return response
 
         return wrapper
 
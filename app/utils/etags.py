@@ -0,0 +1,72 @@
+from hashlib import blake2b
+from collections.abc import Iterable
+
+from app.database import Base
+from app.utils.serializers import SerializedRow, get_serializer
+
+
+def make_etag(version: str, fields: tuple[str, ...] = ()) -> str:
+    """Sparse representations of a row get ETags of their own, suffixed by a hash of the fields."""
+    if not fields:
+        return f'"{version}"'
+    return f'"{version}-{blake2b(",".join(fields).encode(), digest_size=4).hexdigest()}"'
+
+
+def item_etag(instance: Base | SerializedRow, fields: tuple[str, ...] = ()) -> str | None:
+    """Strong ETag of a single row, taken from its version so the body needn't be hashed."""
+    if isinstance(instance, SerializedRow):
+        version = instance.version
+    else:
+        version = get_serializer(type(instance)).version(instance)
+    if version is None:
+        return None
+    return make_etag(version, fields)
+
+
+def collection_etag(instances: Iterable[Base], url: str) -> str:
+    """Strong ETag of a page, the URL covers query parameters which the page links depend on.
+
+    Total count and the next link are hashed as well, they can change while the page
+    itself doesn't.
+    """
+    digest = blake2b(url.encode(), digest_size=16)
+    digest.update(f"{getattr(instances, 'total', None)};".encode())
+    digest.update(
+        f"{getattr(instances, 'has_next', None)}:{getattr(instances, 'next_cursor', None)};".encode()
+    )
+    for instance in instances:
+        serializer = get_serializer(type(instance))
+        digest.update(f"{instance.id_str}:{serializer.version(instance)};".encode())
+    return make_etag(digest.hexdigest())
+
+
+def etag_matches(header: str | None, etag: str | None, weak: bool = False) -> bool:
+    """Check an If-Match or If-None-Match header, If-None-Match compares weakly."""
+    if not header or etag is None:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def etag_versions(header: str) -> tuple[str, ...] | None:
+    """Row versions named by an If-Match header, None for `*` which accepts any version.
+
+    If-Match compares strongly, so weak ETags name no version. Sparse ETags don't
+    equal any version either, writes need the ETag of the whole row.
+    """
+    if header.strip() == "*":
+        return None
+    return tuple(
+        candidate[1:-1]
+        for candidate in map(str.strip, header.split(","))
+        if len(candidate) > 1 and candidate.startswith('"') and candidate.endswith('"')
+    )
@@ -1,9 +1,12 @@
 from functools import singledispatch, wraps
+from inspect import iscoroutinefunction
 from collections.abc import Callable
 
 from fastapi import HTTPException
 from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from sqlalchemy.exc import IntegrityError as SQLAIntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from psycopg.errors import IntegrityError as PsycopgIntegrityError
 
 
@@ -13,6 +16,34 @@ class ResourceNotFoundException(Exception):
         self.detail = f"{entity_name.capitalize()} not found."
 
 
+class ResourceExistsException(Exception):
+    def __init__(self, entity_name: str):
+        self.entity_name = entity_name
+        self.detail = f"{entity_name.capitalize()} with that identifier already exists."
+
+
+class ResourceConflictException(Exception):
+    def __init__(self, entity_name: str, detail: str | None = None):
+        self.entity_name = entity_name
+        self.detail = detail or f"{entity_name.capitalize()} is in a conflicting state."
+
+
+class PreconditionFailedException(Exception):
+    def __init__(self, entity_name: str):
+        self.entity_name = entity_name
+        self.detail = f"{entity_name.capitalize()} has been modified, fetch it again."
+
+
+class InvalidCursorException(Exception):
+    def __init__(self, detail: str = "Invalid pagination cursor."):
+        self.detail = detail
+
+
+class InvalidFilterException(Exception):
+    def __init__(self, detail: str = "Invalid filter or sort."):
+        self.detail = detail
+
+
 @singledispatch
 def handle_exception(exc: Exception, _: str) -> HTTPException:
     raise exc
@@ -20,10 +51,12 @@ def handle_exception(exc: Exception, _: str) -> HTTPException:
 
 @handle_exception.register
 def _(exc: SQLAIntegrityError | PsycopgIntegrityError, entity: str) -> HTTPException:
-    return HTTPException(
-        status_code=400,
-        detail=f"{entity.capitalize()} with that identifier already exists.",
-    )
+    return handle_exception(ResourceExistsException(entity), entity)
+
+
+@handle_exception.register
+def _(exc: ResourceExistsException, _: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=exc.detail)
 
 
 @handle_exception.register
@@ -42,6 +75,32 @@ def _(exc: ResourceNotFoundException, _: str) -> HTTPException:
     return HTTPException(status_code=404, detail=exc.detail)
 
 
+@handle_exception.register
+def _(exc: ResourceConflictException, _: str) -> HTTPException:
+    return HTTPException(status_code=409, detail=exc.detail)
+
+
+@handle_exception.register
+def _(exc: PreconditionFailedException, _: str) -> HTTPException:
+    return HTTPException(status_code=412, detail=exc.detail)
+
+
+@handle_exception.register
+def _(exc: StaleDataError, entity: str) -> HTTPException:
+    # the ORM found another version of the row than the one it loaded
+    return handle_exception(PreconditionFailedException(entity), entity)
+
+
+@handle_exception.register
+def _(exc: InvalidCursorException, _: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=exc.detail)
+
+
+@handle_exception.register
+def _(exc: InvalidFilterException, _: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=exc.detail)
+
+
 @handle_exception.register
 def _(exc: AttributeError, entity: str) -> HTTPException:
     return HTTPException(
@@ -50,13 +109,31 @@ def _(exc: AttributeError, entity: str) -> HTTPException:
     )
 
 
+def describe_validation_error(exc: ValidationError) -> str:
+    """Function to word pydantic errors the same way as invalid request bodies are."""
+    errors = exc.errors()
+    return handle_exception(RequestValidationError(errors), err_msg=errors[0]["msg"]).detail
+
+
 def handle_exceptions[**P, T](func: Callable[P, T]) -> Callable[P, T]:
+    if iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(self, *args: P.args, **kwargs: P.kwargs) -> T:
+            try:
+                return await func(self, *args, **kwargs)
+            except Exception as exc:
+                entity_name = getattr(self, "name", "unknown")
+                raise handle_exception(exc, entity_name) from exc
+
+        return async_wrapper
+
     @wraps(func)
-    def async_wrapper(self, *args: P.args, **kwargs: P.kwargs) -> T:
+    def sync_wrapper(self, *args: P.args, **kwargs: P.kwargs) -> T:
         try:
             return func(self, *args, **kwargs)
         except Exception as exc:
             entity_name = getattr(self, "name", "unknown")
             raise handle_exception(exc, entity_name) from exc
 
-    return async_wrapper
+    return sync_wrapper
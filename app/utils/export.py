@@ -0,0 +1,70 @@
+from csv import writer
+from io import StringIO
+from itertools import islice
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator, Callable
+
+from orjson import dumps
+
+from app.database import Base
+from app.utils.serializers import get_serializer
+
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+ROWS_PER_CHUNK = 100
+
+
+def ndjson_chunk(instances: list[Base]) -> bytes:
+    to_dict = get_serializer(type(instances[0])).to_dict
+    return b"".join(dumps(to_dict(instance)) + b"\n" for instance in instances)
+
+
+def csv_chunk(instances: list[Base]) -> str:
+    to_dict = get_serializer(type(instances[0])).to_jsonable_dict
+    buffer = StringIO()
+    writer(buffer).writerows(to_dict(instance).values() for instance in instances)
+    return buffer.getvalue()
+
+
+def csv_header(model: type[Base]) -> str:
+    buffer = StringIO()
+    writer(buffer).writerow(get_serializer(model).keys)
+    return buffer.getvalue()
+
+
+def stream_export(
+    instances: Iterable[Base] | AsyncIterable[Base], model: type[Base], export_format: str
+) -> Iterator[str | bytes] | AsyncIterator[str | bytes]:
+    """Function to encode streamed rows into chunks of NDJSON or CSV text.
+
+    Rows are grouped in small chunks, so the first bytes leave as soon as the first
+    batch arrives from the server-side cursor and memory doesn't grow with the table.
+    """
+    header = csv_header(model) if export_format == "csv" else ""
+    encode: Callable[[list[Base]], str | bytes] = (
+        csv_chunk if export_format == "csv" else ndjson_chunk
+    )
+
+    if isinstance(instances, AsyncIterable):
+
+        async def async_chunks() -> AsyncIterator[str | bytes]:
+            if header:
+                yield header
+            chunk = []
+            async for instance in instances:
+                chunk.append(instance)
+                if len(chunk) == ROWS_PER_CHUNK:
+                    yield encode(chunk)
+                    chunk = []
+            if chunk:
+                yield encode(chunk)
+
+        return async_chunks()
+
+    def chunks() -> Iterator[str | bytes]:
+        if header:
+            yield header
+        iterator = iter(instances)
+        while chunk := list(islice(iterator, ROWS_PER_CHUNK)):
+            yield encode(chunk)
+
+    return chunks()
@@ -0,0 +1,79 @@
+from functools import cache
+from typing import Any
+from collections.abc import Callable
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import BindParameter, ColumnElement
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.utils.exceptions import InvalidFilterException
+
+# (field, operator, flag value) of every filter, values of real columns are bound parameters
+type FilterShape = tuple[tuple[str, str, bool | None], ...]
+# (field, descending) of every sort column
+type SortSpec = tuple[tuple[str, bool], ...]
+# sorted names of requested fields, empty means all of them
+type FieldSpec = tuple[str, ...]
+
+FILTER_OPERATORS: dict[
+    str, Callable[[InstrumentedAttribute, BindParameter], ColumnElement[bool]]
+] = {
+    "eq": lambda column, value: column == value,
+    "in": lambda column, value: column.in_(value),
+    "prefix": lambda column, value: column.like(value, escape="\\"),
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+}
+
+
+def split_filter_key(key: str) -> tuple[str, str]:
+    """Function to split `field__operator` query keys, bare `field` means equality."""
+    field, _, operator = key.partition("__")
+    return field, operator or "eq"
+
+
+def parse_sort(sort_by: str | None) -> SortSpec:
+    """Function to turn `author,-title` into sort spec, leading minus sorts descending."""
+    if not sort_by:
+        return ()
+    names = (name.strip() for name in sort_by.split(","))
+    return tuple((name.lstrip("-"), name.startswith("-")) for name in names if name)
+
+
+def parse_fields(fields: str | None) -> FieldSpec:
+    """Function to turn `title,id` into field spec, sorted so equal requests share statements."""
+    if not fields:
+        return ()
+    return tuple(sorted({name.strip() for name in fields.split(",")} - {""}))
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@cache
+def get_adapter(python_type: type) -> TypeAdapter:
+    return TypeAdapter(python_type)
+
+
+def parse_flag(key: str, value: Any) -> bool:
+    try:
+        return get_adapter(bool).validate_python(value)
+    except ValidationError as exc:
+        raise InvalidFilterException(f"Invalid value of {key} filter.") from exc
+
+
+def parse_filter_value(key: str, column: InstrumentedAttribute, operator: str, value: Any) -> Any:
+    """Function to convert query strings to the column type, lists are comma separated."""
+    adapter = get_adapter(column.type.python_type)
+    try:
+        if operator == "in":
+            values = value.split(",") if isinstance(value, str) else value
+            return [adapter.validate_python(item) for item in values]
+        if operator == "prefix":
+            return f"{escape_like(str(value))}%"
+        return adapter.validate_python(value)
+    except ValidationError as exc:
+        raise InvalidFilterException(f"Invalid value of {key} filter.") from exc
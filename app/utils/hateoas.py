@@ -1,56 +1,90 @@
+from functools import lru_cache
+from urllib.parse import urlencode
+
 from app.database import Base
 from app.config import settings
-from app.utils.utils import base_to_dict
+from app.utils.serializers import SerializedRow, get_serializer, project_row
 
 
 def build_query(base_url: str, name: str, inst_id: str | None = "") -> str:
     return f"{base_url}{settings.api_latest}/{name}s/{inst_id}"
 
 
-def generate_item_links(
-    built_url: str,
-    url: str,
-    extra_rels: list[dict] | None = None,
-) -> list[dict]:
-    links = [
-        {"rel": "self", "href": url},
-        {"rel": "update", "href": built_url, "method": "PUT"},
-        {"rel": "delete", "href": built_url, "method": "DELETE"},
+type FrozenRels = tuple[tuple[tuple[str, str], ...], ...]
+type LinkTemplate = tuple[str, tuple[tuple[str, str | None, str | None], ...]]
+
+
+def freeze_rels(extra_rels: list[dict] | None) -> FrozenRels:
+    return tuple(tuple(sorted(relation.items())) for relation in extra_rels or ())
+
+
+@lru_cache(maxsize=256)
+def get_link_template(base_url: str, name: str, extra_rels: FrozenRels) -> LinkTemplate:
+    """Resolve links of one kind of items once, per item only its ID is filled in.
+
+    Template keeps the collection URL and (rel, endpoint, method) of every link,
+    endpoint of the self link is None as it points at the requested URL.
+    """
+    rels = [("self", None, None), ("update", "", "PUT"), ("delete", "", "DELETE")]
+    for relation in map(dict, extra_rels):
+        rels.append((relation.get("rel"), relation.get("endpoint", ""), relation.get("method")))
+        if overwrite := relation.get("overwrite"):
+            rels = [rel for rel in rels if rel[0] != overwrite]
+    return build_query(base_url, name), tuple(rels)
+
+
+def generate_item_links(template: LinkTemplate, inst_id: str, url: str | None = None) -> list[dict]:
+    collection_url, rels = template
+    built_url = collection_url + inst_id
+    return [
+        {"rel": rel, "href": url or built_url}
+        if endpoint is None
+        else {"rel": rel, "href": built_url + endpoint, "method": method}
+        for rel, endpoint, method in rels
     ]
-    if extra_rels:
-        for relation in extra_rels:
-            link = {}
-            link["rel"] = relation.get("rel")
-            link["href"] = built_url + relation.get("endpoint", "")
-            link["method"] = relation.get("method")
-            links.append(link)
-            if overwrite := relation.get("overwrite"):
-                links = [lnk for lnk in links if lnk.get("rel") != overwrite]
-    return links
 
 
 def generate_collection_links(
     page: int,
     limit: int,
     base_url: str,
+    has_next: bool = True,
+    sort_by: str | None = None,
+    cursor: str | None = None,
+    next_cursor: str | None = None,
+    params: dict[str, str] | None = None,
 ) -> list[dict]:
-    links = [
-        {"rel": "self", "href": f"{base_url}?page={page}&limit={limit}"},
-        {"rel": "next", "href": f"{base_url}?page={page + 1}&limit={limit}"},
-    ]
+    """Page links, `params` are further query parameters every page keeps, e.g. filters."""
+    query = f"&limit={limit}" + (f"&sort_by={sort_by}" if sort_by else "")
+    if params:
+        query += f"&{urlencode(params)}"
+    if cursor is not None:
+        links = [{"rel": "self", "href": f"{base_url}?cursor={cursor}{query}"}]
+        if has_next and next_cursor:
+            links.append({"rel": "next", "href": f"{base_url}?cursor={next_cursor}{query}"})
+        return links
+
+    links = [{"rel": "self", "href": f"{base_url}?page={page}{query}"}]
+    if has_next:
+        links.append({"rel": "next", "href": f"{base_url}?page={page + 1}{query}"})
     if page > 1:
-        links.append({"rel": "prev", "href": f"{base_url}?page={page - 1}&limit={limit}"})
+        links.append({"rel": "prev", "href": f"{base_url}?page={page - 1}{query}"})
     return links
 
 
 def get_hateoas_item(
-    instance: Base, base_url: str, url: str, extra_rels: dict | None = None
+    instance: Base | SerializedRow,
+    base_url: str,
+    url: str,
+    extra_rels: dict | None = None,
+    fields: tuple[str, ...] = (),
 ) -> dict:
-    item = base_to_dict(instance)
-    name = instance.__tablename__
-    inst_id = instance.id_str
-    built_url = build_query(base_url, name, inst_id)
-    item["_links"] = generate_item_links(built_url, url, extra_rels)
+    if isinstance(instance, SerializedRow):
+        item = dict(project_row(instance, fields))
+    else:
+        item = get_serializer(type(instance), fields).to_dict(instance)
+    template = get_link_template(base_url, instance.__tablename__, freeze_rels(extra_rels))
+    item["_links"] = generate_item_links(template, instance.id_str, url)
     return item
 
 
@@ -59,10 +93,31 @@ def get_hateoas_list(
     page: int,
     limit: int,
     base_url: str,
+    sort_by: str | None = None,
+    cursor: str | None = None,
+    extra_rels: list[dict] | None = None,
+    item_links: bool = False,
+    collection_url: str | None = None,
+    params: dict[str, str] | None = None,
+    fields: tuple[str, ...] = (),
 ) -> dict:
     name = items[0].__tablename__ if len(items) else ""
-    built_url = build_query(base_url, name)
-    return {
-        "items": [base_to_dict(item) for item in items],
-        "_links": generate_collection_links(page, limit, built_url),
+    built_url = collection_url or build_query(base_url, name)
+    has_next = getattr(items, "has_next", len(items) >= limit)
+    next_cursor = getattr(items, "next_cursor", None)
+    to_dict = get_serializer(type(items[0]), fields).to_dict if len(items) else None
+    serialized = [to_dict(item) for item in items]
+    if item_links and serialized:
+        template = get_link_template(base_url, name, freeze_rels(extra_rels))
+        for item in serialized:
+            item["_links"] = generate_item_links(template, str(item["id"]))
+    formatted = {
+        "items": serialized,
+        "_links": generate_collection_links(
+            page, limit, built_url, has_next, sort_by, cursor, next_cursor, params
+        ),
     }
+    if (total := getattr(items, "total", None)) is not None:
+        formatted["total"] = total
+        formatted["total_estimated"] = items.total_estimated
+    return formatted
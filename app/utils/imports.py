@@ -0,0 +1,44 @@
+from csv import DictReader
+from io import TextIOWrapper
+from json import loads, JSONDecodeError
+from collections.abc import Iterator
+from typing import BinaryIO
+
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+type ImportRow = tuple[int, dict | ValueError]
+
+
+def guess_import_format(filename: str | None, content_type: str | None = None) -> str:
+    if (filename or "").lower().endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    return "ndjson"
+
+
+def read_rows(stream: BinaryIO, import_format: str) -> Iterator[ImportRow]:
+    """Function to read an uploaded file row by row, without loading it into memory.
+
+    Yields line numbers with parsed rows, rows which can't be parsed come as errors.
+    """
+    text = TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        if import_format == "csv":
+            reader = DictReader(text)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = loads(line)
+                except JSONDecodeError:
+                    yield line_number, ValueError("Malformed JSON line.")
+                    continue
+                if not isinstance(row, dict):
+                    row = ValueError("JSON line should be an object.")
+                yield line_number, row
+    finally:
+        # the caller owns the binary stream, the wrapper mustn't close it
+        text.detach()
@@ -0,0 +1,56 @@
+from copy import copy
+from logging import Filter, Formatter, LogRecord, StreamHandler, WARNING, getLogger
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from random import random
+
+
+LOG_FORMAT = "[%(asctime)s - %(name)s] (%(levelname)s) %(message)s"
+
+
+class SamplingFilter(Filter):
+    """Keep the given share of records below WARNING, warnings and errors always pass.
+
+    Filters run before the record is enqueued, so dropped messages never get their args merged.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: LogRecord) -> bool:
+        return record.levelno >= WARNING or self.rate >= 1.0 or random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler leaving the formatting to the handlers of the listener thread.
+
+    The stock one formats every record on the logging thread, this one only merges its args,
+    which may change after the call.
+    """
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        record = copy(record)
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+
+def setup_logging(level: str, sample_rate: float) -> QueueListener:
+    """Hand records to a queue, a background thread writes them to stderr.
+
+    Request handlers only enqueue, formatting and slow writes of the stream don't block
+    the event loop.
+    The listener is started, stop it on shutdown to flush the queue.
+    """
+    queue = SimpleQueue()
+    stream_handler = StreamHandler()
+    stream_handler.setFormatter(Formatter(LOG_FORMAT))
+    queue_handler = DeferredQueueHandler(queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    listener = QueueListener(queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,224 @@
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.pool import pool_status
+
+
+type Labels = tuple[str, ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Labels, values: Labels, **extra: str) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label values.
+
+    Recording is a bisect and three additions under a lock, buckets get summed on scrape only.
+    """
+
+    def __init__(self, name: str, description: str, labels: Labels, buckets: tuple[float, ...]):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.series: dict[Labels, list] = {}
+        self.lock = Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with self.lock:
+            if (series := self.series.get(labels)) is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = [
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self.series.items()
+            ]
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(self.labels, labels, le=str(bound))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.lock = Lock()
+
+    def add(self, amount: int) -> None:
+        with self.lock:
+            self.value += amount
+
+    def expose(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {self.value}",
+        ]
+
+
+class RequestStats:
+    """Work done on behalf of one request, SQL is filled in by engine events.
+
+    `statements` counts runs of every normalized statement, only while SQL profiling is on.
+    """
+
+    __slots__ = ("queries", "db_time", "started", "serialize_time", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.started: float | None = None
+        self.serialize_time = 0.0
+        self.statements: Counter[str] = Counter()
+
+
+# sync views run in the threadpool with a copy of the context, so the stats object is shared
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+REQUEST_LABELS = ("method", "route", "status")
+ROUTE_LABELS = ("method", "route")
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time to respond.", REQUEST_LABELS, LATENCY_BUCKETS
+)
+requests_in_flight = Gauge("http_requests_in_flight", "Requests being handled.")
+request_db_duration = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent executing SQL per request.",
+    ROUTE_LABELS,
+    LATENCY_BUCKETS,
+)
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ROUTE_LABELS, QUERY_BUCKETS
+)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if (stats := request_stats.get()) is not None:
+        stats.started = perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if (stats := request_stats.get()) is not None and stats.started is not None:
+        stats.queries += 1
+        stats.db_time += perf_counter() - stats.started
+        stats.started = None
+
+
+def record_serialize(elapsed: float) -> None:
+    if (stats := request_stats.get()) is not None:
+        stats.serialize_time += elapsed
+
+
+def instrument(engine: Engine) -> None:
+    if event.contains(engine, "before_cursor_execute", before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and SQL work per route."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        requests_in_flight.add(1)
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - started
+            requests_in_flight.add(-1)
+            request_stats.reset(token)
+            # route templates keep the label count bounded, unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            request_duration.observe((method, route, str(status)), elapsed)
+            request_db_duration.observe((method, route), stats.db_time)
+            request_queries.observe((method, route), stats.queries)
+
+
+POOL_METRICS = (
+    ("checkouts", "db_pool_checkouts_total", "counter", "Connections checked out."),
+    ("timeouts", "db_pool_timeouts_total", "counter", "Checkouts which timed out."),
+    ("checked_out", "db_pool_checked_out", "gauge", "Connections in use."),
+    ("capacity", "db_pool_capacity", "gauge", "Pool size with max overflow."),
+)
+
+
+def expose_pools(engines: dict[str, Engine]) -> list[str]:
+    """Pool counters read on scrape, wait total over checkouts gives the average checkout wait."""
+    statuses = {name: pool_status(engine.pool) for name, engine in engines.items()}
+    waits = {
+        name: engine.pool.stats.wait_total
+        for name, engine in engines.items()
+        if hasattr(engine.pool, "stats")
+    }
+    lines = []
+    for key, metric, kind, description in POOL_METRICS:
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {kind}"]
+        lines += [
+            f'{metric}{{pool="{name}"}} {status[key]}'
+            for name, status in statuses.items()
+            if key in status
+        ]
+    metric = "db_pool_checkout_wait_seconds_total"
+    lines += [f"# HELP {metric} Time spent waiting for connections.", f"# TYPE {metric} counter"]
+    lines += [f'{metric}{{pool="{name}"}} {wait}' for name, wait in waits.items()]
+    return lines
+
+
+def expose(engines: dict[str, Engine]) -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = requests_in_flight.expose()
+    for histogram in (request_duration, request_db_duration, request_queries):
+        lines += histogram.expose()
+    lines += expose_pools(engines)
+    return "\n".join(lines) + "\n"
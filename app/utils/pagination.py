@@ -0,0 +1,52 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from json import dumps, loads
+
+from pydantic import ValidationError
+
+from app.utils.exceptions import InvalidCursorException
+from app.utils.filters import get_adapter
+
+
+class Page[T](list[T]):
+    """List of fetched items which knows whether more rows follow it and how many match."""
+
+    def __init__(self, items: list[T], has_next: bool = False, next_cursor: str | None = None):
+        super().__init__(items)
+        self.has_next = has_next
+        self.next_cursor = next_cursor
+        self.total: int | None = None
+        self.total_estimated = False
+
+
+def encode_cursor(sort_by: str | None, values: list) -> str:
+    """Function to pack the sort key of the last returned row into an opaque cursor."""
+    payload = dumps([sort_by, values], separators=(",", ":"))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str | None) -> list:
+    """Function to unpack a cursor, empty cursor means the first page."""
+    if not cursor:
+        return []
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort_by, values = loads(urlsafe_b64decode(padded.encode()))
+    except (BinasciiError, UnicodeDecodeError, ValueError, TypeError) as exc:
+        raise InvalidCursorException() from exc
+    if cursor_sort_by != sort_by or not isinstance(values, list):
+        raise InvalidCursorException()
+    return values
+
+
+def parse_cursor_values(values: list, python_types: list[type]) -> list:
+    """Function to check decoded cursor values against the types of the sort key they stand for."""
+    if len(values) != len(python_types):
+        raise InvalidCursorException()
+    try:
+        return [
+            get_adapter(python_type).validate_python(value)
+            for value, python_type in zip(values, python_types)
+        ]
+    except ValidationError as exc:
+        raise InvalidCursorException() from exc
@@ -0,0 +1,88 @@
+from threading import Lock
+from time import perf_counter
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, PoolProxiedConnection, QueuePool
+
+from app.config import settings
+
+
+class PoolStats:
+    """Checkout counters of one pool, time spent waiting includes connecting and pre-ping."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.checkouts = self.timeouts = 0
+        self.wait_total = self.wait_max = 0.0
+        self.peak_checked_out = 0
+
+    def record(self, waited: float, checked_out: int, timed_out: bool = False) -> None:
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+
+class TimedPoolMixin:
+    """Pool which measures how long every checkout waits for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self) -> PoolProxiedConnection:
+        started = perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.stats.record(perf_counter() - started, self.checkedout(), timed_out=True)
+            raise
+        self.stats.record(perf_counter() - started, self.checkedout())
+        return connection
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_status(
+    pool: Pool, max_overflow: int = settings.db_max_overflow
+) -> dict[str, int | float | None]:
+    """Current occupancy of the pool, with checkout statistics of timed pools.
+
+    Saturation is the share of all allowed connections (size + max overflow) in use,
+    close to 1 means requests start queueing for connections. Pools don't expose their
+    max overflow, so it's the configured one unless given.
+    """
+    status = {"pool": pool.__class__.__name__}
+    if not isinstance(pool, QueuePool):
+        return status
+
+    capacity = pool.size() + max(max_overflow, 0)
+    status |= {
+        "size": pool.size(),
+        "capacity": capacity,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "saturation": round(pool.checkedout() / capacity, 3) if capacity else None,
+    }
+    if stats := getattr(pool, "stats", None):
+        checkouts = stats.checkouts + stats.timeouts
+        status |= {
+            "checkouts": stats.checkouts,
+            "timeouts": stats.timeouts,
+            "wait_avg_ms": round(stats.wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+            "wait_max_ms": round(stats.wait_max * 1000, 3),
+            "peak_checked_out": stats.peak_checked_out,
+            "peak_saturation": round(stats.peak_checked_out / capacity, 3) if capacity else None,
+        }
+    return status
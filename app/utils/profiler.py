@@ -0,0 +1,142 @@
+from logging import getLogger
+from re import compile as re_compile
+from threading import Lock
+from time import perf_counter
+
+from sqlalchemy import Engine, event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.metrics import RequestStats, request_stats
+
+
+logger = getLogger(__name__)
+
+WHITESPACE = re_compile(r"\s+")
+# expanded IN lists and multi-row VALUES differ only in the number of placeholders
+PLACEHOLDER_LIST = re_compile(r"\((?:%\(\w+\)s|\?|\$\d+)(?:, (?:%\(\w+\)s|\?|\$\d+))*\)")
+
+
+def normalize_sql(statement: str) -> str:
+    return PLACEHOLDER_LIST.sub("(...)", WHITESPACE.sub(" ", statement).strip())
+
+
+class StatementProfile:
+    """Run count and time of every normalized statement since the start of the process."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.statements: dict[str, list] = {}
+
+    def record(self, statement: str, elapsed: float) -> None:
+        with self.lock:
+            if (entry := self.statements.get(statement)) is None:
+                entry = self.statements[statement] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+
+    def stats(self, top: int = 20) -> list[dict]:
+        """Statements taking the most time in total first."""
+        with self.lock:
+            entries = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {
+                "statement": statement,
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "avg_ms": round(total / calls * 1000, 3),
+                "max_ms": round(longest * 1000, 3),
+            }
+            for statement, (calls, total, longest) in entries[:top]
+        ]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.statements.clear()
+
+
+profile = StatementProfile()
+
+
+class StatementProfiler:
+    """Engine event listeners timing statements, logging the slow ones with their parameters."""
+
+    def __init__(self, slow_query_ms: float):
+        self.slow_query = slow_query_ms / 1000
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # kept on the execution context, a failed statement leaves nothing behind on the connection
+        context._profiler_started = perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - context._profiler_started
+        normalized = normalize_sql(statement)
+        profile.record(normalized, elapsed)
+        if (stats := request_stats.get()) is not None:
+            stats.statements[normalized] += 1
+        if elapsed >= self.slow_query:
+            logger.warning(
+                "Slow query took %.1f ms: %s with parameters: %s",
+                elapsed * 1000,
+                statement,
+                parameters,
+            )
+
+    def instrument(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self.after_cursor_execute)
+
+
+def server_timing(stats: RequestStats, total: float) -> str:
+    return (
+        f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries", '
+        f"serialize;dur={stats.serialize_time * 1000:.2f}, "
+        f"total;dur={total * 1000:.2f}"
+    )
+
+
+class ProfilingMiddleware:
+    """ASGI middleware adding a Server-Timing header and reporting N+1 statements of a request.
+
+    Needs the SQL work of the request recorded, so it runs inside MetricsMiddleware.
+    """
+
+    def __init__(self, app: ASGIApp, n_plus_one_threshold: int):
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        if (stats := request_stats.get()) is None:
+            stats = RequestStats()
+            token = request_stats.set(stats)
+        started = perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(stats, perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if token is not None:
+                request_stats.reset(token)
+            self.report_repeated(scope, stats)
+
+    def report_repeated(self, scope: Scope, stats: RequestStats) -> None:
+        for statement, runs in stats.statements.items():
+            if runs >= self.n_plus_one_threshold:
+                logger.warning(
+                    "Possible N+1 in %s %s, statement run %d times: %s",
+                    scope["method"],
+                    scope["path"],
+                    runs,
+                    statement,
+                )
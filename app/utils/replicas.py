@@ -0,0 +1,126 @@
+from collections.abc import Callable
+from contextvars import ContextVar
+from itertools import count
+from logging import getLogger
+from threading import Lock
+from time import monotonic
+
+from psycopg import OperationalError
+from psycopg.errors import QueryCanceled
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import ExceptionContext
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+logger = getLogger(__name__)
+
+# set for GET and HEAD requests, the only ones whose reads may go to replicas
+read_only_request: ContextVar[bool] = ContextVar("read_only_request", default=False)
+
+
+class ReplicaRouter:
+    """Round-robin over replica engines, a replica that failed sits out for `retry_after` seconds."""
+
+    def __init__(self, engines: list[Engine], retry_after: float):
+        self.engines = engines
+        self.retry_after = retry_after
+        self.ejected: dict[Engine, float] = {}
+        self.turns = count()
+        self.lock = Lock()
+        for engine in engines:
+            event.listen(engine, "handle_error", self.on_error)
+
+    def pick(self) -> Engine | None:
+        """Next healthy replica, None when all of them are ejected."""
+        now = monotonic()
+        for _ in self.engines:
+            with self.lock:
+                engine = self.engines[next(self.turns) % len(self.engines)]
+            if self.ejected.get(engine, 0.0) <= now:
+                return engine
+        return None
+
+    def eject(self, engine: Engine) -> None:
+        self.ejected[engine] = monotonic() + self.retry_after
+        logger.warning("Replica %s ejected for %s seconds.", engine.url.host, self.retry_after)
+
+    def is_ejected(self, engine: Engine) -> bool:
+        return self.ejected.get(engine, 0.0) > monotonic()
+
+    def on_error(self, context: ExceptionContext) -> None:
+        # a timed out statement says nothing about the health of the replica
+        error = context.original_exception
+        if context.is_disconnect or (
+            isinstance(error, OperationalError) and not isinstance(error, QueryCanceled)
+        ):
+            self.eject(context.engine)
+
+
+class RoutingSession(Session):
+    """Session sending reads of read-only requests to replicas and anything else to the primary.
+
+    Once the session writes, it stays on the primary, so it reads its own writes.
+    A read failing on a replica which got ejected for it is run once more on the primary.
+    """
+
+    def __init__(self, *args, replicas: ReplicaRouter, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self.on_primary = False
+        self.replica: Engine | None = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs) -> Engine:
+        primary = super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if isinstance(clause, UpdateBase):
+            self.on_primary = True
+        if self.on_primary or not read_only_request.get():
+            return primary
+        self.replica = self.replicas.pick()
+        return self.replica or primary
+
+    def execute(self, *args, **kwargs):
+        return self.retry_on_primary(super().execute, *args, **kwargs)
+
+    def scalars(self, *args, **kwargs):
+        return self.retry_on_primary(super().scalars, *args, **kwargs)
+
+    def scalar(self, *args, **kwargs):
+        return self.retry_on_primary(super().scalar, *args, **kwargs)
+
+    def retry_on_primary[T](self, run: Callable[..., T], *args, **kwargs) -> T:
+        self.replica = None
+        try:
+            return run(*args, **kwargs)
+        except Exception:
+            if self.replica is None or not self.replicas.is_ejected(self.replica):
+                raise
+            logger.warning("Read failed on replica %s, retrying on primary.", self.replica.url.host)
+            # the connection of the replica is broken, it can't be used in this transaction again
+            self.rollback()
+            self.on_primary = True
+            return run(*args, **kwargs)
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def stay_on_primary(session: RoutingSession, flush_context, instances) -> None:
+    # flushes are writes, ORM doesn't pass their statements to get_bind
+    session.on_primary = True
+
+
+class ReadOnlyRequestMiddleware:
+    """ASGI middleware marking GET and HEAD requests as read-only."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        token = read_only_request.set(True)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            read_only_request.reset(token)
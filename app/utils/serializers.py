@@ -0,0 +1,84 @@
+from datetime import datetime
+from functools import cache
+from operator import attrgetter
+from typing import Any
+
+from sqlalchemy.inspection import inspect
+
+from app.database import Base
+
+
+class SerializedRow(dict):
+    """Serialized instance which still knows its table, ID and version.
+
+    That's enough to build its links and ETag without the mapped instance.
+    """
+
+    __slots__ = ("__tablename__", "id_str", "version")
+
+    def __init__(self, data: dict[str, Any], tablename: str, id_str: str, version: Any = None):
+        super().__init__(data)
+        self.__tablename__ = tablename
+        self.id_str = id_str
+        self.version = version
+
+
+class ModelSerializer:
+    """Class to serialize instances of one mapped model.
+
+    Column keys, the attribute getter and converters are resolved once per model,
+    so serializing a row is one C-level attrgetter call and a zip.
+    Columns marked with ``info={"serialize": False}`` stay out of the output,
+    with `fields` given only those and the primary key are serialized.
+    """
+
+    def __init__(self, model: type[Base], fields: tuple[str, ...] = ()):
+        mapper = inspect(model)
+        primary_keys = {column.key for column in mapper.primary_key}
+        columns = [
+            column
+            for column in mapper.column_attrs
+            if column.columns[0].info.get("serialize", True)
+            and (not fields or column.key in fields or column.key in primary_keys)
+        ]
+        self.version_key = mapper.version_id_col.key if mapper.version_id_col is not None else None
+        self.keys = tuple(column.key for column in columns)
+        self.datetime_keys = tuple(
+            column.key for column in columns if column.columns[0].type.python_type is datetime
+        )
+        getter = attrgetter(*self.keys)
+        self.values = getter if len(self.keys) > 1 else lambda instance: (getter(instance),)
+
+    def to_dict(self, instance: Base) -> dict[str, Any]:
+        """Native values, meant to be encoded by orjson which handles datetime on its own."""
+        return dict(zip(self.keys, self.values(instance)))
+
+    def to_row(self, instance: Base) -> SerializedRow:
+        return SerializedRow(
+            self.to_dict(instance), instance.__tablename__, instance.id_str, self.version(instance)
+        )
+
+    def version(self, instance: Base) -> Any:
+        """Row version of the instance, None when the model isn't versioned."""
+        return getattr(instance, self.version_key) if self.version_key else None
+
+    def to_jsonable_dict(self, instance: Base) -> dict[str, Any]:
+        """Values safe for any JSON or CSV encoder, datetimes in ISO format."""
+        serialized = self.to_dict(instance)
+        for key in self.datetime_keys:
+            if isinstance(value := serialized[key], datetime):
+                serialized[key] = value.isoformat()
+        return serialized
+
+
+@cache
+def get_serializer(model: type[Base], fields: tuple[str, ...] = ()) -> ModelSerializer:
+    return ModelSerializer(model, fields)
+
+
+def project_row(row: SerializedRow, fields: tuple[str, ...]) -> SerializedRow:
+    """Sparse copy of a serialized row, it keeps its ID."""
+    if not fields:
+        return row
+    data = {key: value for key, value in row.items() if key in fields or key == "id"}
+    return SerializedRow(data, row.__tablename__, row.id_str, row.version)
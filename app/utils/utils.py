@@ -1,19 +1,7 @@
-from datetime import datetime
-
-from sqlalchemy.inspection import inspect
-
 from app.database import Base
+from app.utils.serializers import get_serializer
 
 
 def base_to_dict(instance: Base) -> dict[str, str | None]:
     """Function to convert SQLALchemy Base model into dict."""
-    b2d = {}
-    for column in inspect(instance).mapper.column_attrs:
-        value = getattr(instance, column.key)
-
-        if isinstance(value, (datetime)):
-            value = value.isoformat()
-
-        b2d[column.key] = value
-
-    return b2d
+    return get_serializer(type(instance)).to_jsonable_dict(instance)
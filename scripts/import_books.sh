@@ -0,0 +1,4 @@
+#!/bin/bash
+
+echo "📚 Importing books..."
+uv run python -m app.books.imports "$@"
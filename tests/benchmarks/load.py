@@ -0,0 +1,270 @@
+"""Load test of the running API: a mix of book traffic at a set concurrency, latency per route.
+
+Boots app.main:api with uvicorn in a background thread, seeds books built by tests/factories.py
+and replays the mix over HTTP. The client shares the process with the server, so compare runs
+with each other rather than with production numbers.
+
+uv run python -m tests.benchmarks.load --db-uri sqlite:///load.db --mix read_book=8,borrow=2
+uv run python -m tests.benchmarks.load --recreate --books 1000 --requests 5000 --concurrency 20
+
+Seeding drops and recreates the book table. The configured database is only touched with
+--recreate, otherwise --db-uri has to name a scratch one. The table is created from the models,
+not by the migrations, so its indexes may differ from production.
+"""
+
+from argparse import ArgumentParser
+from asyncio import Queue, gather, run, sleep
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from logging import WARNING, getLogger
+from random import Random
+from statistics import quantiles
+from threading import Thread
+from time import perf_counter
+
+from httpx import AsyncClient, Limits
+from sqlalchemy import Connection, Engine, create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from uvicorn import Config, Server
+
+from app.books.models import Book
+from app.config import settings
+from app.database import (
+    Base,
+    async_engine,
+    engine,
+    get_db,
+    prepare_async_sessionmaker,
+    prepare_sessionmaker,
+)
+from app.main import api
+from tests.factories import BookBorrowed, BookFree
+
+
+DEFAULT_MIX = "read_book=50,read_books=25,borrow=10,return=10,create=5"
+PAGE_LIMIT = 20
+
+
+@dataclass
+class Traffic:
+    """Seeded book IDs the scenarios draw from, creations may hit a taken ID and get 400."""
+
+    ids: list[str]
+    random: Random
+
+    def book_id(self) -> str:
+        return self.random.choice(self.ids)
+
+    def new_id(self) -> str:
+        return f"{self.random.randint(0, 999999):06d}"
+
+
+type Scenario = Callable[[Traffic], tuple[str, str, dict | None]]
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "read_book": lambda traffic: ("GET", f"/books/{traffic.book_id()}", None),
+    "read_books": lambda traffic: (
+        "GET",
+        f"/books?page={traffic.random.randint(1, 5)}&limit={PAGE_LIMIT}",
+        None,
+    ),
+    "borrow": lambda traffic: (
+        "PATCH",
+        f"/books/{traffic.book_id()}/borrow",
+        {"reader": f"{traffic.random.randint(0, 999999):06d}"},
+    ),
+    "return": lambda traffic: ("POST", f"/books/{traffic.book_id()}/return", None),
+    "create": lambda traffic: (
+        "POST",
+        "/books",
+        {"id": traffic.new_id(), "title": "Load test", "author": "Anonymous"},
+    ),
+}
+
+
+@dataclass
+class RouteStats:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+
+    def summary(self, elapsed: float) -> dict:
+        """Latencies in milliseconds, p99 needs at least two samples."""
+        latencies = sorted(self.latencies)
+        cuts = quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            "requests": len(latencies),
+            "throughput": len(latencies) / elapsed,
+            "p50": cuts[49] * 1000,
+            "p95": cuts[94] * 1000,
+            "p99": cuts[98] * 1000,
+            "statuses": dict(sorted(self.statuses.items())),
+        }
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name}, choose from {', '.join(SCENARIOS)}.")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+def seed(connection: Connection, books: int, random: Random) -> list[str]:
+    """Recreate the book table with factory books, a fifth of them borrowed."""
+    Base.metadata.drop_all(connection, tables=[Book.__table__])
+    Base.metadata.create_all(connection, tables=[Book.__table__])
+    rows = {}
+    for _ in range(books):
+        book = BookBorrowed.build() if random.random() < 0.2 else BookFree.build()
+        rows[book.id] = {
+            "id": book.id,
+            "title": book.title,
+            "author": book.author,
+            "reader": book.reader,
+            "borrowing_time": book.borrowing_time,
+        }
+    connection.execute(insert(Book), list(rows.values()))
+    return list(rows)
+
+
+async def prepare_database(db_uri: str | None, books: int, random: Random) -> list[str]:
+    """Seed the database, with a URI given the API sessions are bound to it as well."""
+    if db_uri is None:
+        if settings.db_async:
+            return await seed_async(async_engine, books, random)
+        return seed_sync(engine, books, random)
+
+    if settings.db_async:
+        load_engine = create_async_engine(db_uri)
+        session_factory = prepare_async_sessionmaker(load_engine)
+
+        async def get_load_db():
+            async with session_factory() as db:
+                yield db
+
+        api.dependency_overrides[get_db] = get_load_db
+        return await seed_async(load_engine, books, random)
+
+    load_engine = create_engine(db_uri, connect_args=connect_args(db_uri))
+    session_factory = prepare_sessionmaker(load_engine)
+
+    def get_load_db():
+        with session_factory() as db:
+            yield db
+
+    api.dependency_overrides[get_db] = get_load_db
+    return seed_sync(load_engine, books, random)
+
+
+def connect_args(db_uri: str) -> dict:
+    # requests are served from the threadpool
+    return {"check_same_thread": False} if db_uri.startswith("sqlite") else {}
+
+
+def seed_sync(engine: Engine, books: int, random: Random) -> list[str]:
+    with engine.begin() as connection:
+        return seed(connection, books, random)
+
+
+async def seed_async(engine: AsyncEngine, books: int, random: Random) -> list[str]:
+    async with engine.begin() as connection:
+        return await connection.run_sync(seed, books, random)
+
+
+async def start_server(port: int) -> Server:
+    server = Server(Config(api, port=port, log_level="warning", access_log=False))
+    Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        await sleep(0.05)
+    return server
+
+
+async def replay(
+    base_url: str,
+    traffic: Traffic,
+    weights: dict[str, int],
+    requests: int,
+    concurrency: int,
+) -> tuple[dict[str, RouteStats], float]:
+    plan = traffic.random.choices(list(weights), weights=list(weights.values()), k=requests)
+    queue = Queue()
+    for name in plan:
+        queue.put_nowait(name)
+    stats = defaultdict(RouteStats)
+    limits = Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+
+        async def worker():
+            while not queue.empty():
+                name = queue.get_nowait()
+                method, url, body = SCENARIOS[name](traffic)
+                started = perf_counter()
+                response = await client.request(method, url, json=body)
+                stats[name].latencies.append(perf_counter() - started)
+                stats[name].statuses[response.status_code] += 1
+
+        started = perf_counter()
+        await gather(*(worker() for _ in range(concurrency)))
+        elapsed = perf_counter() - started
+    return stats, elapsed
+
+
+def print_report(stats: dict[str, RouteStats], elapsed: float) -> None:
+    total = sum(len(route.latencies) for route in stats.values())
+    print(f"{total} requests in {elapsed:.2f} s, {total / elapsed:.1f} requests/s")
+    print(f"{'route':>12} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, route in sorted(stats.items()):
+        summary = route.summary(elapsed)
+        print(
+            f"{name:>12} {summary['requests']:>9} {summary['throughput']:>9.1f}"
+            f" {summary['p50']:>9.2f} {summary['p95']:>9.2f} {summary['p99']:>9.2f}"
+            f"  {summary['statuses']}"
+        )
+
+
+async def main() -> dict[str, dict]:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=1000, help="books seeded before the run")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight, comma separated")
+    parser.add_argument("--db-uri", help="database to run against instead of the configured one")
+    parser.add_argument(
+        "--recreate",
+        action="store_true",
+        help="allow recreating the book table of the configured database",
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random traffic")
+    arguments = parser.parse_args()
+    if arguments.db_uri is None and not arguments.recreate:
+        parser.error("seeding drops the book table, pass --db-uri or --recreate")
+
+    for name in ("app", "httpx"):
+        getLogger(name).setLevel(WARNING)
+    random = Random(arguments.seed)
+    weights = parse_mix(arguments.mix)
+    traffic = Traffic(await prepare_database(arguments.db_uri, arguments.books, random), random)
+
+    server = await start_server(arguments.port)
+    try:
+        stats, elapsed = await replay(
+            f"http://127.0.0.1:{arguments.port}{settings.api_latest}",
+            traffic,
+            weights,
+            arguments.requests,
+            arguments.concurrency,
+        )
+    finally:
+        server.should_exit = True
+    print_report(stats, elapsed)
+    return {name: route.summary(elapsed) for name, route in stats.items()}
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,80 @@
+"""Per-call cost of hot repository queries: rebuilt ORM constructs against the cached statements.
+
+An in-memory SQLite database keeps the round trip negligible, so what's left is the Python-side
+query construction, compilation cache lookup and result processing.
+
+uv run python -m tests.benchmarks.queries
+"""
+
+from timeit import Timer
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app.books.models import Book
+from app.books.services import book_service
+from app.database import Base
+
+
+ROWS = 100
+REPEAT = 5
+PAGE = {"filters": {"author": "Author 7"}, "offset": 0, "limit": 10, "sort_by": "title"}
+
+
+def make_session(rows: int = ROWS) -> Session:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Book.__table__])
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Book),
+            [
+                {
+                    "id": f"{number:06d}",
+                    "title": f"Title {number}",
+                    "author": f"Author {number % 10}",
+                }
+                for number in range(rows)
+            ],
+        )
+    return Session(engine)
+
+
+def legacy_get(db: Session, object_id: str) -> Book | None:
+    return db.query(Book).filter(Book.id == object_id).one_or_none()
+
+
+def legacy_get_all(db: Session, filters: dict, offset: int, limit: int, sort_by: str) -> list[Book]:
+    # what get_all did before the statements were cached per filter shape
+    query = db.query(Book)
+    for key, value in filters.items():
+        query = query.filter(getattr(Book, key) == value)
+    return query.order_by(getattr(Book, sort_by), Book.id).offset(offset).limit(limit).all()
+
+
+def per_call_microseconds(call) -> float:
+    timer = Timer(call)
+    loops, _ = timer.autorange()
+    best = min(timer.repeat(repeat=REPEAT, number=loops))
+    return best / loops * 1_000_000
+
+
+def main() -> dict[str, float]:
+    db = make_session()
+    repository = book_service.crud
+    results = {
+        "legacy get": per_call_microseconds(lambda: legacy_get(db, "000042")),
+        "cached get": per_call_microseconds(lambda: repository.get(db, "000042")),
+        "legacy get_all": per_call_microseconds(lambda: legacy_get_all(db, **PAGE)),
+        "cached get_all": per_call_microseconds(lambda: repository.get_all(db, **PAGE)),
+    }
+    for name, cost in results.items():
+        print(f"{name:>15}: {cost:.1f} µs per call")
+    for query in ("get", "get_all"):
+        speedup = results[f"legacy {query}"] / results[f"cached {query}"]
+        print(f"{query:>7} speedup: {speedup:.1f}x")
+    db.close()
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Per-row cost of serializing a list page: the previous pipeline against the compiled one.
+
+uv run python -m tests.benchmarks.serialization
+"""
+
+from datetime import datetime, timezone
+from json import dumps
+from timeit import Timer
+
+from fastapi.encoders import jsonable_encoder
+from orjson import dumps as orjson_dumps
+from sqlalchemy.inspection import inspect
+
+from app.books.models import Book
+from app.utils.serializers import get_serializer
+
+
+ROWS = 1000
+REPEAT = 5
+
+
+def make_books(rows: int = ROWS) -> list[Book]:
+    borrowed_at = datetime(1954, 7, 29, 12, tzinfo=timezone.utc)
+    return [
+        Book(
+            id=f"{number:06d}",
+            title=f"Title {number}",
+            author=f"Author {number % 50}",
+            reader=f"{number:06d}" if number % 2 else None,
+            borrowing_time=borrowed_at if number % 2 else None,
+        )
+        for number in range(rows)
+    ]
+
+
+def legacy_base_to_dict(instance: Book) -> dict:
+    b2d = {}
+    for column in inspect(instance).mapper.column_attrs:
+        value = getattr(instance, column.key)
+        if isinstance(value, (datetime)):
+            value = value.isoformat()
+        b2d[column.key] = value
+    return b2d
+
+
+def legacy_pipeline(books: list[Book]) -> bytes:
+    # base_to_dict, jsonable_encoder and JSONResponse.render as they used to run
+    content = jsonable_encoder({"items": [legacy_base_to_dict(book) for book in books]})
+    return dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def compiled_pipeline(books: list[Book]) -> bytes:
+    to_dict = get_serializer(Book).to_dict
+    return orjson_dumps({"items": [to_dict(book) for book in books]})
+
+
+def per_row_microseconds(pipeline, books: list[Book]) -> float:
+    timer = Timer(lambda: pipeline(books))
+    loops, _ = timer.autorange()
+    best = min(timer.repeat(repeat=REPEAT, number=loops))
+    return best / loops / len(books) * 1_000_000
+
+
+def main() -> dict[str, float]:
+    books = make_books()
+    results = {
+        "legacy": per_row_microseconds(legacy_pipeline, books),
+        "compiled": per_row_microseconds(compiled_pipeline, books),
+    }
+    for name, cost in results.items():
+        print(f"{name:>10}: {cost:.3f} µs per row ({ROWS} rows per page)")
+    print(f"   speedup: {results['legacy'] / results['compiled']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
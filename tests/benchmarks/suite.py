@@ -0,0 +1,146 @@
+"""Microbenchmarks of the request hot path, saved as JSON to compare commits on one machine.
+
+uv run python -m tests.benchmarks.suite
+uv run python -m tests.benchmarks.suite --compare .benchmarks/<older commit>.json
+"""
+
+from argparse import ArgumentParser
+from asyncio import new_event_loop
+from datetime import datetime, timezone
+from json import dumps, loads
+from pathlib import Path
+from platform import platform, python_version
+from subprocess import run
+from timeit import Timer
+
+from starlette.requests import Request
+
+from app.books.services import book_service
+from app.utils.api_utils import format_response
+from app.utils.exceptions import handle_exceptions
+from app.utils.hateoas import get_hateoas_list, get_link_template, generate_item_links
+from app.utils.utils import base_to_dict
+from tests.benchmarks.queries import PAGE, make_session
+from tests.benchmarks.serialization import ROWS
+
+
+REPEAT = 5
+RESULTS_DIR = Path(".benchmarks")
+BASE_URL = "http://testserver"
+
+
+def make_request(path: str = "/api/v1/books/") -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "scheme": "http",
+            "server": ("testserver", 80),
+            "path": path,
+            "root_path": "",
+            "query_string": b"",
+            "headers": [],
+        }
+    )
+
+
+class Service:
+    name = "book"
+
+    def plain(self, value: int) -> int:
+        return value
+
+    @handle_exceptions
+    def decorated(self, value: int) -> int:
+        return value
+
+
+def microseconds(call) -> float:
+    """Best of REPEAT runs, per call."""
+    timer = Timer(call)
+    loops, _ = timer.autorange()
+    return min(timer.repeat(repeat=REPEAT, number=loops)) / loops * 1_000_000
+
+
+def collect() -> dict[str, float]:
+    db = make_session(ROWS)
+    repository = book_service.crud
+    # persistent instances, ETags need their identity
+    books = repository.get_all(db, {}, 0, ROWS, None)
+    template = get_link_template(BASE_URL, "book", ())
+    service = Service()
+
+    @format_response(is_collection=True)
+    async def read_books(request: Request, pagination: dict) -> list:
+        return books
+
+    loop = new_event_loop()
+    request = make_request()
+    pagination = {"page": 1, "limit": ROWS, "sort_by": None, "cursor": None}
+
+    cases = {
+        "base_to_dict": lambda: base_to_dict(books[0]),
+        "generate_item_links": lambda: generate_item_links(template, "000042"),
+        f"get_hateoas_list[{ROWS}]": lambda: get_hateoas_list(
+            books, 1, ROWS, BASE_URL, item_links=True
+        ),
+        f"format_response[{ROWS}]": lambda: loop.run_until_complete(
+            read_books(request=request, pagination=pagination)
+        ),
+        "handle_exceptions overhead": lambda: service.decorated(1),
+        "undecorated call": lambda: service.plain(1),
+        "CrudRepository.get": lambda: repository.get(db, "000042"),
+        "CrudRepository.get_all": lambda: repository.get_all(db, **PAGE),
+    }
+    try:
+        results = {name: microseconds(call) for name, call in cases.items()}
+    finally:
+        db.close()
+        loop.close()
+    results["handle_exceptions overhead"] -= results.pop("undecorated call")
+    return results
+
+
+def current_commit() -> str:
+    completed = run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return completed.stdout.strip() or "unknown"
+
+
+def save(results: dict[str, float], commit: str) -> Path:
+    RESULTS_DIR.mkdir(exist_ok=True)
+    path = RESULTS_DIR / f"{commit}.json"
+    report = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": python_version(),
+        "platform": platform(),
+        "unit": "µs per call",
+        "results": results,
+    }
+    path.write_text(dumps(report, indent=2, ensure_ascii=False))
+    return path
+
+
+def print_results(results: dict[str, float], baseline: dict[str, float] | None = None) -> None:
+    for name, cost in results.items():
+        line = f"{name:>28}: {cost:10.2f} µs"
+        if baseline and (previous := baseline.get(name)):
+            line += f"  ({(cost - previous) / previous:+.1%} against {previous:.2f} µs)"
+        print(line)
+
+
+def main() -> dict[str, float]:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--compare", type=Path, help="results of an earlier run to compare with")
+    arguments = parser.parse_args()
+
+    baseline = loads(arguments.compare.read_text())["results"] if arguments.compare else None
+    commit = current_commit()
+    results = collect()
+    print_results(results, baseline)
+    print(f"Saved to {save(results, commit)}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -21,7 +21,7 @@ class BookFactory(SQLAlchemyModelFactory):
 
 class BookBorrowed(BookFactory):
     reader = LazyFunction(lambda: f"{randint(0, 999999):06d}")
-    borrowing_time = LazyFunction(lambda: datetime.now())
+    borrowing_time = LazyFunction(lambda: datetime.datetime.now(datetime.timezone.utc))
 
 
 class BookFree(BookFactory):
@@ -1,3 +1,5 @@
+import json
+
 from fastapi import status
 
 create_payload = {"id": "012345", "title": "The Lord of the Rings", "author": "J.R.R. Tolkien"}
@@ -32,12 +34,238 @@ def test_endpoint_create_wrong_id(client):
     assert response.json() == {"detail": "Serial number should be 6 digits long."}
 
 
+def test_endpoint_create_bulk(client):
+    payload = [create_payload, {**create_payload, "id": "000012"}]
+    response = client.post("/api/v1/books/bulk", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["created"] == 2
+
+    response = client.post(
+        "/api/v1/books/bulk", json=payload + [{**create_payload, "id": "000001"}]
+    )
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    assert response.json()["created"] == 1
+    assert response.json()["failed"] == 2
+    assert response.json()["items"][0] == {
+        "id": "012345",
+        "status": status.HTTP_400_BAD_REQUEST,
+        "detail": "Book with that identifier already exists.",
+    }
+
+
 def test_endpoint_get(client, free_book, book_api_response_get):
     response = client.get("/api/v1/books/012345")
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == book_api_response_get
 
 
+def test_endpoint_get_conditional(client, free_book):
+    response = client.get("/api/v1/books/012345")
+    etag = response.headers["etag"]
+
+    response = client.get("/api/v1/books/012345", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["etag"] == etag
+
+    client.patch("/api/v1/books/012345/borrow", json={"reader": "123456"})
+    response = client.get("/api/v1/books/012345", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != etag
+
+
+def test_endpoint_get_all_conditional(client, books_100):
+    response = client.get("/api/v1/books", params={"limit": 10})
+    etag = response.headers["etag"]
+
+    response = client.get("/api/v1/books", params={"limit": 10}, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = client.get("/api/v1/books", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_endpoint_get_fields_conditional(client, free_book):
+    full_etag = client.get("/api/v1/books/012345").headers["etag"]
+    etag = client.get("/api/v1/books/012345", params={"fields": "title"}).headers["etag"]
+
+    response = client.get(
+        "/api/v1/books/012345", params={"fields": "title"}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["etag"] == etag
+
+    response = client.get(
+        "/api/v1/books/012345", params={"fields": "title"}, headers={"If-None-Match": full_etag}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == etag
+
+    response = client.get("/api/v1/books/012345", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == full_etag
+
+
+def test_endpoint_get_all_conditional_next(client, free_book):
+    etag = client.get("/api/v1/books", params={"limit": 1}).headers["etag"]
+    client.post("/api/v1/books", json={"id": "999999", "title": "Dune", "author": "F. Herbert"})
+
+    response = client.get("/api/v1/books", params={"limit": 1}, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert [link["rel"] for link in response.json()["_links"]] == ["self", "next"]
+
+
+def test_endpoint_get_all_links(client, books_100):
+    response = client.get("/api/v1/books", params={"author": "J.R.R. Tolkien", "limit": 2})
+    assert response.status_code == status.HTTP_200_OK
+    assert [link["rel"] for link in response.json()["_links"]] == ["self", "next"]
+    assert "author=J.R.R.+Tolkien" in response.json()["_links"][1]["href"]
+
+    response = client.get(
+        "/api/v1/books", params={"author": "J.R.R. Tolkien", "limit": 2, "page": 2}
+    )
+    assert [link["rel"] for link in response.json()["_links"]] == ["self", "prev"]
+
+
+def test_endpoint_get_all_filters(client, books_100):
+    response = client.get(
+        "/api/v1/books", params={"author__in": "J.R.R. Tolkien", "sort_by": "-title", "limit": 2}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [book["id"] for book in response.json()["items"]] == ["012345", "000012"]
+    assert "author__in=J.R.R.+Tolkien" in response.json()["_links"][1]["href"]
+
+    response = client.get("/api/v1/books", params={"title__in": "Hobbit"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"detail": "Filtering by title__in isn't supported."}
+
+
+def test_endpoint_get_fields(client, free_book):
+    full = client.get("/api/v1/books/012345")
+    response = client.get("/api/v1/books/012345", params={"fields": "title"})
+    assert response.status_code == status.HTTP_200_OK
+    assert {key for key in response.json() if key != "_links"} == {"id", "title"}
+    assert response.headers["etag"] != full.headers["etag"]
+
+    response = client.get("/api/v1/books/012345", params={"fields": "version"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"detail": "Field version isn't available."}
+
+    response = client.get("/api/v1/books", params={"fields": "author,title", "limit": 1})
+    assert set(response.json()["items"][0]) == {"id", "title", "author"}
+    assert "fields=author%2Ctitle" in response.json()["_links"][0]["href"]
+
+    response = client.get("/api/v1/books", params={"fields": "version"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"detail": "Field version isn't available."}
+
+
+def test_endpoint_get_all_total(client, books_100):
+    response = client.get("/api/v1/books", params={"limit": 10, "total": "exact"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["total"] == 100
+    assert response.json()["total_estimated"] is False
+
+    response = client.get("/api/v1/books", params={"limit": 10})
+    assert "total" not in response.json()
+
+
+def test_endpoint_search(client, books_100):
+    response = client.get("/api/v1/books/search", params={"q": "Tolkin", "limit": 2})
+    assert response.status_code == status.HTTP_200_OK
+    links = {link["rel"]: link["href"] for link in response.json()["_links"]}
+    assert "q=Tolkin" in links["next"]
+
+    response = client.get(links["next"])
+    assert [book["id"] for book in response.json()["items"]] != []
+    assert [link["rel"] for link in response.json()["_links"]] == ["self"]
+
+
+def test_endpoint_get_all_cursor(client, books_100):
+    response = client.get("/api/v1/books", params={"limit": 60, "cursor": ""})
+    assert response.status_code == status.HTTP_200_OK
+    links = {link["rel"]: link["href"] for link in response.json()["_links"]}
+    assert len(response.json()["items"]) == 60
+
+    response = client.get(links["next"])
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()["items"]) == 40
+    assert [link["rel"] for link in response.json()["_links"]] == ["self"]
+
+
+def test_endpoint_import(client, free_book):
+    source = "\n".join(
+        [
+            json.dumps({"id": "000123", "title": "Silmarillion", "author": "J.R.R. Tolkien"}),
+            "{not json",
+            json.dumps({**create_payload, "title": "The Fellowship of the Ring"}),
+        ]
+    )
+    response = client.post(
+        "/api/v1/books/import", files={"file": ("books.ndjson", source, "application/x-ndjson")}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"line": 2, "error": "Malformed JSON line."},
+        {"summary": {"processed": 3, "upserted": 2, "overwritten": 0, "failed": 1}},
+    ]
+    assert client.get("/api/v1/books/012345").json()["title"] == "The Fellowship of the Ring"
+
+
+def test_endpoint_get_all_item_links(client, free_book, book_api_response_get):
+    response = client.get("/api/v1/books", params={"item_links": True})
+    assert response.status_code == status.HTTP_200_OK
+
+    expected_links = book_api_response_get["_links"]
+    expected_links[0]["href"] = "http://testserver/api/v1/books/012345"
+    assert response.json()["items"][0]["_links"] == expected_links
+
+    response = client.get("/api/v1/books")
+    assert "_links" not in response.json()["items"][0]
+
+
+def test_endpoint_export_ndjson(client, books_100):
+    response = client.get("/api/v1/books/export")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    lines = response.text.splitlines()
+    assert len(lines) == len(books_100)
+    assert json.loads(lines[0]).keys() == {"id", "title", "author", "reader", "borrowing_time"}
+
+
+def test_endpoint_export_csv(client, free_book, free_book_2):
+    response = client.get(
+        "/api/v1/books/export", params={"format": "csv", "author": "J.R.R. Tolkien"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == [
+        "id,title,author,reader,borrowing_time",
+        "000012,The Children of Húrin,J.R.R. Tolkien,,",
+        "012345,The Lord of the Rings,J.R.R. Tolkien,,",
+    ]
+
+
+def test_endpoint_reader_books(client, books_100):
+    response = client.get("/api/v1/readers/123456/books")
+    assert response.status_code == status.HTTP_200_OK
+    assert [book["id"] for book in response.json()["items"]] == ["001234"]
+
+    response = client.get("/api/v1/readers/654321/books")
+    assert response.json()["items"] == []
+
+
+def test_endpoint_overdue(client, borrowed_book, free_book_2):
+    client.patch("/api/v1/books/000012/borrow", json={"reader": "123456"})
+
+    response = client.get("/api/v1/books/overdue", params={"older_than": 14})
+    assert response.status_code == status.HTTP_200_OK
+    assert [book["id"] for book in response.json()["items"]] == ["001234"]
+
+    response = client.get("/api/v1/books/overdue", params={"older_than": 0})
+    assert [book["id"] for book in response.json()["items"]] == ["001234", "000012"]
+
+
 def test_endpoint_borrow(client, free_book, book_api_response_borrow):
     response = client.patch(
         "/api/v1/books/012345/borrow",
@@ -47,6 +275,39 @@ def test_endpoint_borrow(client, free_book, book_api_response_borrow):
     assert response.json() == book_api_response_borrow
 
 
+def test_endpoint_borrow_conflict(client, borrowed_book):
+    response = client.patch("/api/v1/books/001234/borrow", json={"reader": "654321"})
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json() == {"detail": "Book is already borrowed."}
+
+
+def test_endpoint_borrow_precondition(client, free_book):
+    etag = client.get("/api/v1/books/012345").headers["etag"]
+    client.patch("/api/v1/books/012345/borrow", json={"reader": "123456"})
+
+    response = client.post("/api/v1/books/012345/return", headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    etag = client.get("/api/v1/books/012345").headers["etag"]
+    response = client.post("/api/v1/books/012345/return", headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_endpoint_return_batch(client, free_book_2, borrowed_book, borrowed_book_2):
+    response = client.post("/api/v1/books/return", json={"ids": ["001234", "012345"]})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["updated"] == 2
+
+    response = client.post("/api/v1/books/return", json={"ids": ["001234", "000012", "000001"]})
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    assert response.json()["failed"] == 3
+    assert response.json()["items"][2] == {
+        "id": "000001",
+        "status": status.HTTP_404_NOT_FOUND,
+        "detail": "Book not found.",
+    }
+
+
 def test_endpoint_return(client, borrowed_book_2, book_api_response_return):
     response = client.post("/api/v1/books/012345/return")
     assert response.status_code == status.HTTP_200_OK
@@ -57,3 +318,25 @@ def test_endpoint_delete(client, free_book, book_api_response_get):
     response = client.delete("/api/v1/books/012345")
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == book_api_response_get
+
+
+def test_endpoint_delete_precondition(client, free_book):
+    etag = client.get("/api/v1/books/012345").headers["etag"]
+    client.patch(
+        "/api/v1/books/012345/borrow", json={"reader": "123456"}, headers={"If-Match": etag}
+    )
+
+    response = client.delete("/api/v1/books/012345", headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = client.delete("/api/v1/books/012345", headers={"If-Match": f"W/{etag}"})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = client.delete("/api/v1/books/012345", headers={"If-Match": "*"})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_endpoint_filters_documented(client):
+    description = client.get("/openapi.json").json()["paths"]["/api/v1/books"]["get"]["description"]
+    assert "- `author`: eq, in, prefix" in description
+    assert "- `is_borrowed`: true or false" in description
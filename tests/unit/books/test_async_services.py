@@ -0,0 +1,49 @@
+import asyncio
+
+from app.database import async_engine, async_session_factory
+from app.books.schemas import BookCreate, BookBorrow
+from app.books.services import async_book_service as service
+from app.utils.utils import base_to_dict
+
+
+def run_async(operation, *args):
+    async def runner():
+        try:
+            async with async_session_factory() as session:
+                return await operation(session, *args)
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(runner())
+
+
+def test_async_service_create(db_session, book_new_result):
+    new_book = BookCreate(id="000123", title="Silmarillion", author="J.R.R. Tolkien")
+    created_book = run_async(service.create, new_book)
+    assert created_book
+    assert base_to_dict(created_book) == book_new_result
+
+
+def test_async_service_get(db_session, free_book, book_free_result):
+    db_session.commit()
+    book = run_async(service.get, free_book.id)
+    assert book
+    assert base_to_dict(book) == book_free_result
+
+
+def test_async_service_get_all(db_session, books_100):
+    db_session.commit()
+    books = run_async(service.get_all, {"author": "J.R.R. Tolkien"}, 1, 100, None)
+    assert len(books) == 3
+
+
+def test_async_service_update(db_session, free_book):
+    db_session.commit()
+    updated_book = run_async(service.update, free_book.id, BookBorrow(reader="123456"))
+    assert updated_book.reader == "123456"
+
+
+def test_async_service_update_return(db_session, borrowed_book, book_borrowed_return_result):
+    db_session.commit()
+    updated_book = run_async(service.give_back, borrowed_book.id)
+    assert base_to_dict(updated_book) == book_borrowed_return_result
@@ -4,6 +4,7 @@ from freezegun import freeze_time
 from app.books.models import Book
 from app.books.schemas import BookCreate, BookBorrow
 from app.books.services import BookRepository
+from app.utils.exceptions import InvalidFilterException
 from app.utils.utils import base_to_dict
 
 
@@ -20,6 +21,17 @@ def test_repository_create(db_session, book_new_result):
     assert base_to_dict(confirmed_book) == book_new_result
 
 
+def test_repository_create_many(db_session, free_book):
+    new_books = [
+        BookCreate(id="000123", title="Silmarillion", author="J.R.R. Tolkien"),
+        BookCreate(id="012345", title="The Lord of the Rings", author="J.R.R. Tolkien"),
+        BookCreate(id="000111", title="Beren and Lúthien", author="J.R.R. Tolkien"),
+    ]
+    created_ids = repository.create_many(db_session, new_books, batch_size=2)
+    assert created_ids == {"000123", "000111"}
+    assert repository.get(db_session, "000111")
+
+
 def test_repository_get(db_session, free_book, book_free_result):
     book = repository.get(db_session, free_book.id)
     assert book
@@ -50,22 +62,125 @@ def test_repository_get_all(
     assert len(books) == results
 
 
+@pytest.mark.parametrize(
+    "filters, results",
+    [
+        ({"author__in": "J.R.R. Tolkien,C.S. Lewis"}, 3),
+        ({"id__in": "012345,000012,999999"}, 2),
+        ({"title__prefix": "The Lord"}, 1),
+        ({"title__prefix": "%"}, 0),
+        ({"is_borrowed": "true"}, 1),
+        ({"is_borrowed": "false", "author": "J.R.R. Tolkien"}, 2),
+        ({"is_borrowed": "true", "borrowing_time__lt": "1950-01-01T00:00:00+00:00"}, 1),
+    ],
+)
+def test_repository_get_all_filters(db_session, books_100, filters: dict[str, str], results: int):
+    books = repository.get_all(db_session, filters, 0, 100, None)
+    assert len(books) == results
+
+
+@pytest.mark.parametrize(
+    "filters, sort_by, expected_msg",
+    [
+        ({"title__in": "Hobbit"}, None, "Filtering by title__in isn't supported."),
+        ({"version": "1"}, None, "Filtering by version isn't supported."),
+        (
+            {"is_borrowed": "true", "borrowing_time__gt": "yesterday"},
+            None,
+            "Invalid value of borrowing_time__gt filter.",
+        ),
+        ({}, "-version", "Sorting by version isn't supported."),
+        (
+            {"borrowing_time__lt": "1950-01-01T00:00:00+00:00"},
+            None,
+            "Filtering or sorting by borrowing_time needs is_borrowed=true.",
+        ),
+        (
+            {"is_borrowed": "false"},
+            "borrowing_time",
+            "Filtering or sorting by borrowing_time needs is_borrowed=true.",
+        ),
+    ],
+)
+def test_repository_get_all_filters_errors(
+    db_session, filters: dict[str, str], sort_by: str | None, expected_msg: str
+):
+    with pytest.raises(InvalidFilterException) as err:
+        repository.get_all(db_session, filters, 0, 100, sort_by)
+    assert err.value.detail == expected_msg
+
+
+@pytest.mark.parametrize("sort_by", ["-author,title", "-title", "author,-id"])
+def test_repository_get_all_sort_after(db_session, books_100, sort_by: str):
+    expected = [book.id for book in repository.get_all(db_session, {}, 0, 100, sort_by)]
+
+    fetched, after = [], []
+    while page := repository.get_all(db_session, {}, 0, 30, sort_by, after=after):
+        fetched += [book.id for book in page]
+        after = repository.sort_key(page[-1], sort_by)
+
+    assert fetched == expected
+
+
+def test_repository_statement_cache(db_session, books_100):
+    repository.get_all(db_session, {"author": "A", "title__prefix": "B"}, 0, 10, "-title")
+    hits = repository.filter_statement.cache_info().hits
+    repository.get_all(db_session, {"title__prefix": "C", "author": "D"}, 5, 20, "-title")
+    assert repository.filter_statement.cache_info().hits == hits + 1
+
+    other = BookRepository(Book)
+    other.get_all(db_session, {"title__prefix": "C", "author": "D"}, 5, 20, "-title")
+    assert other.filter_statement.cache_info().hits == 0
+    assert repository.filter_statement.cache_info().hits == hits + 1
+
+
+def test_repository_fields(db_session, free_book):
+    statement, _ = repository.prepare_statement(
+        "page", {}, "author", field_spec=repository.field_spec("title")
+    )
+    selected = str(statement).split("FROM")[0]
+    assert "book.title" in selected and "book.author" in selected
+    assert "book.reader" not in selected and "book.version" in selected
+
+    with pytest.raises(InvalidFilterException):
+        repository.field_spec("title,version")
+
+
+def test_repository_get_all_after(db_session, books_100):
+    filters = {"author": "J.R.R. Tolkien"}
+    first_page = repository.get_all(db_session, filters, 0, 2, None, after=[])
+    after = repository.sort_key(first_page[-1], None)
+    second_page = repository.get_all(db_session, filters, 0, 2, None, after=after)
+
+    assert [book.id for book in first_page] == ["000012", "001234"]
+    assert [book.id for book in second_page] == ["012345"]
+
+
 @freeze_time("1954-07-29", tz_offset=0)
 def test_repository_update(db_session, free_book, book_free_update_result):
     update = BookBorrow(reader="123456")
-    updated_book = repository.update(db_session, free_book, update)
+    updated_book = repository.update(db_session, free_book.id, update)
     assert updated_book
     assert base_to_dict(updated_book) == book_free_update_result
 
 
 def test_repository_update_return(db_session, borrowed_book, book_borrowed_return_result):
-    updated_book = repository.update_returned_book(db_session, borrowed_book)
+    updated_book = repository.update_returned_book(db_session, borrowed_book.id)
     assert updated_book
     assert base_to_dict(updated_book) == book_borrowed_return_result
+    assert repository.update_returned_book(db_session, borrowed_book.id) is None
+
+
+@freeze_time("1954-07-29", tz_offset=0)
+def test_repository_update_borrow(db_session, free_book, book_free_update_result):
+    settlement = BookBorrow(reader="123456")
+    updated_book = repository.update_borrowed_book(db_session, free_book.id, settlement)
+    assert base_to_dict(updated_book) == book_free_update_result
+    assert repository.update_borrowed_book(db_session, free_book.id, settlement) is None
 
 
 def test_repository_delete(db_session, free_book):
-    deleted_book = repository.delete(db_session, free_book)
+    deleted_book = repository.delete(db_session, free_book.id)
     assert deleted_book
 
     no_book = repository.get(db_session, deleted_book.id)
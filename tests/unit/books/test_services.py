@@ -1,11 +1,15 @@
 import pytest
+from io import BytesIO, StringIO
 from unittest.mock import patch
 from freezegun import freeze_time
 from fastapi import HTTPException
 
 from app.books.schemas import BookCreate, BookBorrow
 from app.books.services import book_service as service
+from app.utils.cache import TTLCache
 from app.utils.utils import base_to_dict
+from app.utils.imports import read_rows
+from app.utils.pagination import encode_cursor
 
 
 def test_service_create(db_session, book_new_result):
@@ -20,7 +24,7 @@ def test_service_create(db_session, book_new_result):
     new_book_2 = BookCreate(id="000111", title="Beren and Lúthien", author="J.R.R. Tolkien")
     with patch.object(service.logger, "info") as mock_logger:
         service.create(db_session, new_book_2)
-    mock_logger.assert_called_once_with("Created book with ID: 000111.")
+    mock_logger.assert_called_once_with("Created %s with ID: %s.", "book", "000111")
 
 
 @pytest.mark.parametrize(
@@ -43,13 +47,66 @@ def test_service_create_errors(
     assert err.value.detail == expected_msg
 
 
+def test_service_create_many(db_session, free_book):
+    new_books = [
+        BookCreate(id="000123", title="Silmarillion", author="J.R.R. Tolkien"),
+        BookCreate(id="012345", title="The Lord of the Rings", author="J.R.R. Tolkien"),
+        BookCreate(id="000123", title="Silmarillion", author="J.R.R. Tolkien"),
+    ]
+    with patch.object(service.logger, "info") as mock_logger:
+        results = service.create_many(db_session, new_books)
+
+    duplicate = "Book with that identifier already exists."
+    assert results == [
+        {"id": "000123", "status": 201, "detail": None},
+        {"id": "012345", "status": 400, "detail": duplicate},
+        {"id": "000123", "status": 400, "detail": duplicate},
+    ]
+    mock_logger.assert_called_once_with(
+        "Created %d %ss in bulk, %d rejected as duplicates.", 1, "book", 2
+    )
+
+
+def test_service_import_rows(db_session, free_book):
+    source = BytesIO(
+        b"id,title,author\n"
+        b"000123,Silmarillion,J.R.R. Tolkien\n"
+        b"a12345,Roverandom,J.R.R. Tolkien\n"
+        b"012345,The Fellowship of the Ring,J.R.R. Tolkien\n"
+        b"000123,The Silmarillion,J.R.R. Tolkien\n"
+    )
+    report = StringIO()
+    with patch.object(service.logger, "info") as mock_logger:
+        summary = service.import_rows(db_session, read_rows(source, "csv"), BookCreate, report)
+
+    assert summary == {"processed": 4, "upserted": 2, "overwritten": 1, "failed": 1}
+    assert report.getvalue().splitlines() == [
+        '{"line": 3, "error": "Serial number should be 6 digits long."}',
+        '{"summary": {"processed": 4, "upserted": 2, "overwritten": 1, "failed": 1}}',
+    ]
+    assert service.get(db_session, "012345").title == "The Fellowship of the Ring"
+    assert service.get(db_session, "000123").title == "The Silmarillion"
+    mock_logger.assert_any_call("Imported %d %ss, %d rows rejected.", 2, "book", 1)
+
+
 def test_service_get(db_session, free_book, book_free_result):
     with patch.object(service.logger, "info") as mock_logger:
         book = service.get(db_session, free_book.id)
 
     assert book
     assert base_to_dict(book) == book_free_result
-    mock_logger.assert_called_once_with("Fetched book with ID: 012345.")
+    mock_logger.assert_called_once_with("Fetched %s with ID: %s.", "book", "012345")
+
+
+def test_service_get_cached(db_session, free_book, book_free_result):
+    with patch.object(service, "cache", TTLCache("book-test", maxsize=10, ttl=60)) as cache:
+        assert service.get_cached(db_session, free_book.id) == book_free_result
+        assert service.get_cached(db_session, free_book.id) == book_free_result
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        service.update(db_session, free_book.id, BookBorrow(reader="123456"))
+        assert service.get_cached(db_session, free_book.id)["reader"] == "123456"
+        assert (cache.hits, cache.misses) == (1, 2)
 
 
 @pytest.mark.parametrize(
@@ -75,7 +132,86 @@ def test_service_get_all(
         books = service.get_all(db_session, filters, page, limit, sort_by)
 
     assert len(books) == results
-    mock_logger.assert_called_once_with(f"Fetched {results} books. Filters used: {filters}.")
+    mock_logger.assert_called_once_with(
+        "Fetched %d %ss. Filters used: %s.", results, "book", filters
+    )
+
+
+@pytest.mark.parametrize("sort_by", [None, "author", "title"])
+def test_service_get_all_cursor(db_session, books_100, sort_by: str | None):
+    fetched_ids, cursor = [], ""
+    while cursor is not None:
+        books = service.get_all(db_session, {}, 1, 30, sort_by, cursor=cursor)
+        fetched_ids += [book.id for book in books]
+        assert books.has_next == (books.next_cursor is not None)
+        cursor = books.next_cursor
+
+    assert len(fetched_ids) == len(set(fetched_ids)) == len(books_100)
+
+
+@pytest.mark.parametrize(
+    "filters, total_mode, expected",
+    [
+        ({}, "exact", 100),
+        ({"author": "J.R.R. Tolkien"}, "exact", 3),
+        # fresh test tables are small, estimates below the threshold are counted exactly
+        ({}, "estimated", 100),
+        ({"author": "J.R.R. Tolkien"}, "estimated", 3),
+    ],
+)
+def test_service_get_all_total(
+    db_session, books_100, filters: dict[str, str], total_mode: str, expected: int
+):
+    with patch.object(service, "counts", TTLCache("book_count", 10, 60)):
+        books = service.get_all(db_session, filters, 1, 2, None, total=total_mode)
+        assert (books.total, books.total_estimated) == (expected, False)
+
+        service.create(
+            db_session, BookCreate(id="999999", title="Silmarillion", author="J.R.R. Tolkien")
+        )
+        books = service.get_all(db_session, filters, 1, 2, None, total=total_mode)
+        assert books.total == expected + 1
+
+
+def test_service_search(db_session, books_100):
+    with patch.object(service.logger, "info") as mock_logger:
+        books = service.search(db_session, "Tolkin", 2)
+    assert books.has_next
+    mock_logger.assert_called_with("Found %d %ss for phrase: %s.", 2, "book", "Tolkin")
+
+    rest = service.search(db_session, "Tolkin", 2, books.next_cursor)
+    assert not rest.has_next
+    assert {book.id for book in books + rest} == {"012345", "000012", "001234"}
+
+    assert service.search(db_session, "lord of the rings", 1)[0].id == "012345"
+
+
+@pytest.mark.parametrize("after", [["x", "1"], [0.5], [0.5, {"id": "1"}]])
+def test_service_search_cursor_errors(db_session, books_100, after: list):
+    with pytest.raises(HTTPException) as err:
+        service.search(db_session, "Tolkin", 2, encode_cursor("search:Tolkin", after))
+
+    assert err.value.status_code == 400
+    assert err.value.detail == "Invalid pagination cursor."
+
+
+@pytest.mark.parametrize(
+    "sort_by, cursor, expected_msg",
+    [
+        (None, "not-a-cursor", "Invalid pagination cursor."),
+        (None, encode_cursor(None, [{"a": 1}]), "Invalid pagination cursor."),
+        ("author,id", encode_cursor("author,id", ["Tolkien"]), "Invalid pagination cursor."),
+        ("reader", "", "Cursor pagination isn't available when sorting by reader."),
+    ],
+)
+def test_service_get_all_cursor_errors(
+    db_session, books_100, sort_by: str | None, cursor: str, expected_msg: str
+):
+    with pytest.raises(HTTPException) as err:
+        service.get_all(db_session, {}, 1, 30, sort_by, cursor=cursor)
+
+    assert err.value.status_code == 400
+    assert err.value.detail == expected_msg
 
 
 @freeze_time("1954-07-29", tz_offset=0)
@@ -85,7 +221,48 @@ def test_service_update(db_session, free_book, book_free_update_result):
         updated_book = service.update(db_session, free_book.id, update)
     assert updated_book
     assert base_to_dict(updated_book) == book_free_update_result
-    mock_logger.assert_called_with("Updated book with ID: 012345.")
+    mock_logger.assert_called_with("Updated %s with ID: %s.", "book", "012345")
+
+
+@freeze_time("1954-07-29", tz_offset=0)
+def test_service_borrow(db_session, free_book, book_free_update_result):
+    settlement = BookBorrow(reader="123456")
+    with patch.object(service.logger, "info") as mock_logger:
+        borrowed_book = service.borrow(db_session, free_book.id, settlement)
+    assert base_to_dict(borrowed_book) == book_free_update_result
+    mock_logger.assert_called_with("Borrowed book with ID: %s.", "012345")
+
+
+@pytest.mark.parametrize(
+    "book_id, expected_code, expected_msg",
+    [
+        ("001234", 409, "Book is already borrowed."),
+        ("999999", 404, "Book not found."),
+    ],
+)
+def test_service_borrow_errors(db_session, borrowed_book, book_id, expected_code, expected_msg):
+    with pytest.raises(HTTPException) as err:
+        service.borrow(db_session, book_id, BookBorrow(reader="654321"))
+
+    assert err.value.status_code == expected_code
+    assert err.value.detail == expected_msg
+
+
+def test_service_borrow_many(db_session, free_book, free_book_2, borrowed_book):
+    settlement = BookBorrow(reader="654321")
+    with patch.object(service.logger, "info") as mock_logger:
+        results = service.borrow_many(
+            db_session, ["012345", "000012", "001234", "999999", "012345"], settlement
+        )
+
+    assert results == [
+        {"id": "012345", "status": 200, "detail": None},
+        {"id": "000012", "status": 200, "detail": None},
+        {"id": "001234", "status": 409, "detail": "Book is already borrowed."},
+        {"id": "999999", "status": 404, "detail": "Book not found."},
+    ]
+    assert service.get(db_session, "000012").reader == "654321"
+    mock_logger.assert_any_call("Borrowed %d books in batch, %d rejected.", 2, 2)
 
 
 def test_service_update_return(db_session, borrowed_book, book_borrowed_return_result):
@@ -93,13 +270,36 @@ def test_service_update_return(db_session, borrowed_book, book_borrowed_return_r
         updated_book = service.give_back(db_session, borrowed_book.id)
     assert updated_book
     assert base_to_dict(updated_book) == book_borrowed_return_result
-    mock_logger.assert_called_with("Returned book with ID: 001234.")
+    mock_logger.assert_called_with("Returned book with ID: %s.", "001234")
+
+    with pytest.raises(HTTPException) as err:
+        service.give_back(db_session, borrowed_book.id)
+    assert err.value.status_code == 409
+    assert err.value.detail == "Book isn't borrowed."
 
 
 def test_service_delete(db_session, free_book):
     with patch.object(service.logger, "info") as mock_logger:
         deleted_book = service.delete(db_session, free_book.id)
     assert deleted_book
-    mock_logger.assert_called_with("Deleted book with ID: 012345.")
+    mock_logger.assert_called_with("Deleted %s with ID: %s.", "book", "012345")
     no_book = service.get(db_session, deleted_book.id, False)
     assert not no_book
+
+
+def test_service_conditional_writes(db_session, borrowed_book):
+    version = borrowed_book.version
+    with patch.object(service, "cache", TTLCache("book-test", maxsize=10, ttl=60)):
+        service.get_cached(db_session, borrowed_book.id)
+        service.give_back(db_session, borrowed_book.id, (version,))
+
+        # the same ETag can't pass twice, the cached row takes no part in the check
+        with pytest.raises(HTTPException) as err:
+            service.borrow(db_session, borrowed_book.id, BookBorrow(reader="654321"), (version,))
+        assert err.value.status_code == 412
+        with pytest.raises(HTTPException) as err:
+            service.delete(db_session, borrowed_book.id, (version,))
+        assert err.value.status_code == 412
+
+        current = service.get(db_session, borrowed_book.id).version
+        assert service.delete(db_session, borrowed_book.id, ("stale", current))
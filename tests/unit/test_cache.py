@@ -0,0 +1,22 @@
+from app.books.services import book_service
+from app.utils.cache import TTLCache, caches
+
+
+def test_cache_eviction_and_expiry():
+    cache = TTLCache("test", maxsize=2, ttl=60)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    assert cache.get("a") is None
+    assert cache.get("c") == "c"
+    assert cache.evictions == 1
+
+    cache.ttl = 0
+    cache.set("d", "d")
+    assert cache.get("d") is None
+    assert cache.expirations == 1
+
+
+def test_cache_registry():
+    TTLCache("book_count", maxsize=10, ttl=60)
+    assert caches["book_count"] is book_service.counts
+    assert "test" not in caches
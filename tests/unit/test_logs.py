@@ -0,0 +1,31 @@
+from logging import INFO, WARNING, LogRecord
+from queue import SimpleQueue
+
+import pytest
+
+from app.utils.logs import DeferredQueueHandler, SamplingFilter
+
+
+def make_record(level: int) -> LogRecord:
+    return LogRecord("app", level, __file__, 1, "Fetched %s with ID: %s.", ("book", "012345"), None)
+
+
+@pytest.mark.parametrize("rate, kept", [(1.0, 100), (0.0, 0)])
+def test_sampling_filter_info(rate: float, kept: int):
+    sampling = SamplingFilter(rate)
+
+    assert sum(sampling.filter(make_record(INFO)) for _ in range(100)) == kept
+
+
+def test_sampling_filter_keeps_warnings():
+    assert SamplingFilter(0.0).filter(make_record(WARNING))
+
+
+def test_deferred_queue_handler():
+    queue = SimpleQueue()
+    record = make_record(INFO)
+
+    DeferredQueueHandler(queue).handle(record)
+    queued = queue.get_nowait()
+    assert (queued.msg, queued.args) == ("Fetched book with ID: 012345.", None)
+    assert not hasattr(queued, "message") and record.args == ("book", "012345")
@@ -0,0 +1,40 @@
+from app.database import engine
+from app.utils.metrics import Histogram, instrument
+
+
+def test_histogram_expose():
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), (0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(("/books",), value)
+
+    assert histogram.expose()[2:] == [
+        'latency_seconds_bucket{route="/books",le="0.1"} 1',
+        'latency_seconds_bucket{route="/books",le="1.0"} 2',
+        'latency_seconds_bucket{route="/books",le="+Inf"} 3',
+        'latency_seconds_sum{route="/books"} 5.55',
+        'latency_seconds_count{route="/books"} 3',
+    ]
+
+
+def sample(client, series: str) -> float:
+    """Value of the series in the exposition, metrics are process-wide so tests compare deltas."""
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rpartition(" ")[2])
+    return 0.0
+
+
+def test_metrics_endpoint(client, free_book):
+    instrument(engine)
+    labels = 'method="GET",route="/api/v1/books/{book_id}"'
+    requests = f'http_request_duration_seconds_count{{{labels},status="200"}}'
+    queries = f"http_request_db_queries_sum{{{labels}}}"
+    requests_before, queries_before = sample(client, requests), sample(client, queries)
+
+    client.get("/api/v1/books/012345")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "http_requests_in_flight 1" in response.text
+    assert sample(client, requests) == requests_before + 1
+    assert sample(client, queries) > queries_before
@@ -0,0 +1,27 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.utils.pool import TimedQueuePool, pool_status
+
+
+def test_pool_status():
+    pool = TimedQueuePool(
+        lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=1, timeout=0.01
+    )
+    first, second = pool.connect(), pool.connect()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.connect()
+
+    status = pool_status(pool, max_overflow=1)
+    assert status["checked_out"] == status["capacity"] == 2
+    assert status["saturation"] == 1.0
+    assert (status["checkouts"], status["timeouts"]) == (2, 1)
+    assert status["wait_max_ms"] >= 10
+
+    first.close()
+    second.close()
+    assert pool_status(pool, max_overflow=1)["checked_out"] == 0
+    assert pool_status(pool, max_overflow=1)["peak_saturation"] == 1.0
@@ -0,0 +1,54 @@
+from logging import WARNING
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.utils.metrics import MetricsMiddleware, instrument
+from app.utils.profiler import ProfilingMiddleware, StatementProfiler, normalize_sql, profile
+
+
+def test_normalize_sql():
+    statement = "SELECT book.id \nFROM book \nWHERE book.id IN (%(ids_1_1)s, %(ids_1_2)s)"
+
+    assert normalize_sql(statement) == "SELECT book.id FROM book WHERE book.id IN (...)"
+
+
+def test_profiling_middleware(caplog):
+    engine = create_engine("sqlite://")
+    instrument(engine)
+    StatementProfiler(slow_query_ms=0).instrument(engine)
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, n_plus_one_threshold=3)
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/books")
+    def read_books():
+        with engine.connect() as connection:
+            return [connection.scalar(text("SELECT :id"), {"id": id}) for id in range(3)]
+
+    profile.clear()
+    with caplog.at_level(WARNING, logger="app.utils.profiler"):
+        response = TestClient(app).get("/books")
+
+    db, serialize, total = response.headers["server-timing"].split(", ")
+    assert db.startswith("db;dur=") and db.endswith(';desc="3 queries"')
+    assert serialize.startswith("serialize;dur=") and total.startswith("total;dur=")
+    assert profile.stats()[0]["statement"] == "SELECT ?"
+    assert profile.stats()[0]["calls"] == 3
+    assert "Slow query took" in caplog.text
+    assert "Possible N+1 in GET /books, statement run 3 times: SELECT ?" in caplog.text
+
+
+def test_failed_statement_not_profiled():
+    engine = create_engine("sqlite://")
+    StatementProfiler(slow_query_ms=1000).instrument(engine)
+
+    profile.clear()
+    with engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM missing_table"))
+        assert connection.scalar(text("SELECT 1")) == 1
+    assert [entry["statement"] for entry in profile.stats()] == ["SELECT 1"]
@@ -0,0 +1,89 @@
+import pytest
+from psycopg import OperationalError as PsycopgOperationalError
+from sqlalchemy import create_engine, event, insert, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.books.models import Book
+from app.utils.replicas import ReplicaRouter, RoutingSession, read_only_request
+
+
+@pytest.fixture
+def routing_sessions(tmp_path):
+    primary, replica = (
+        create_engine(f"sqlite:///{tmp_path / name}.db") for name in ("primary", "replica")
+    )
+    for engine in (primary, replica):
+        Base.metadata.create_all(engine, tables=[Book.__table__])
+    with replica.begin() as connection:
+        connection.execute(insert(Book).values(id="000000", title="Replica", author="Anonymous"))
+
+    router = ReplicaRouter([replica], retry_after=60)
+    token = read_only_request.set(True)
+    yield sessionmaker(class_=RoutingSession, replicas=router, bind=primary), router
+    read_only_request.reset(token)
+
+
+def titles(db) -> list[str]:
+    return list(db.scalars(select(Book.title)))
+
+
+def test_reads_go_to_replica(routing_sessions):
+    session_factory, _ = routing_sessions
+
+    with session_factory() as db:
+        assert titles(db) == ["Replica"]
+
+
+def test_writes_stay_on_primary(routing_sessions):
+    session_factory, _ = routing_sessions
+
+    with session_factory() as db:
+        db.execute(insert(Book).values(id="111111", title="Primary", author="Anonymous"))
+        db.commit()
+        assert titles(db) == ["Primary"]
+
+
+def test_reads_of_write_requests_go_to_primary(routing_sessions):
+    session_factory, _ = routing_sessions
+    token = read_only_request.set(False)
+
+    with session_factory() as db:
+        assert titles(db) == []
+    read_only_request.reset(token)
+
+
+def test_ejected_replica_falls_back_to_primary(routing_sessions):
+    session_factory, router = routing_sessions
+
+    with session_factory() as db:
+        with pytest.raises(OperationalError):
+            db.execute(text("SELECT * FROM missing_table"))
+        assert not router.is_ejected(router.engines[0])
+
+        router.eject(router.engines[0])
+        assert router.pick() is None
+        assert titles(db) == []
+
+
+def test_failed_read_retried_on_primary(routing_sessions):
+    session_factory, router = routing_sessions
+    replica = router.engines[0]
+
+    def replica_down(*_):
+        raise PsycopgOperationalError("replica is down")
+
+    event.listen(replica, "do_execute", replica_down)
+    with session_factory() as db:
+        assert titles(db) == []
+        assert router.is_ejected(replica)
+
+
+def test_flushes_stay_on_primary(routing_sessions):
+    session_factory, _ = routing_sessions
+
+    with session_factory() as db:
+        db.add(Book(id="111111", title="Primary", author="Anonymous"))
+        db.flush()
+        assert titles(db) == ["Primary"]
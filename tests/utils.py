@@ -1,7 +1,7 @@
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm import scoped_session
 
-from app.database import engine
+from app.database import engine, prepare_sessionmaker
 
 
-session_factory = sessionmaker(bind=engine)
+session_factory = prepare_sessionmaker(engine)
 Session = scoped_session(session_factory)